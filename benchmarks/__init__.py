@@ -0,0 +1 @@
+"""Benchmarks for the json_agg package."""
@@ -0,0 +1,54 @@
+"""Django setup shared by benchmarks."""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+
+
+DB_PATH = Path(tempfile.gettempdir()) / "json_agg_benchmarks.sqlite3"
+
+
+def add_db_arguments(parser: argparse.ArgumentParser):
+    """Add database arguments (mirroring the test suite options) to ``parser``."""
+    parser.add_argument("--db-vendor", default="sqlite")
+    parser.add_argument("--db-name", default="postgres")
+    parser.add_argument("--db-user", default="postgres")
+    parser.add_argument("--db-password", default="")
+    parser.add_argument("--db-host", default="127.0.0.1")
+    parser.add_argument("--db-port", default="5432")
+
+
+def configure(args: argparse.Namespace):
+    """Configure django for the database of ``args``, keeping its data."""
+    if args.db_vendor == "sqlite":
+        db_settings = {"ENGINE": "django.db.backends.sqlite3", "NAME": str(DB_PATH)}
+    else:
+        db_settings = {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": args.db_name,
+            "USER": args.db_user,
+            "PASSWORD": args.db_password,
+            "HOST": args.db_host,
+            "PORT": args.db_port,
+        }
+    settings.configure(
+        DATABASES={"default": db_settings},
+        INSTALLED_APPS=("django.contrib.contenttypes", "json_agg", "tests"),
+        SECRET_KEY="not a secret in benchmarks",  # noqa: S106
+    )
+    django.setup()
+
+
+def setup(args: argparse.Namespace):
+    """Configure django and create a fresh schema for the test models."""
+    if args.db_vendor == "sqlite":
+        DB_PATH.unlink(missing_ok=True)
+    configure(args)
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    call_command("flush", interactive=False, verbosity=0)
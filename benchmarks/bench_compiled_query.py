@@ -0,0 +1,76 @@
+"""Benchmark the per request overhead saved by CompiledQuery.
+
+Usage: python -m benchmarks.bench_compiled_query [--db-vendor postgresql ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from benchmarks import _django
+
+
+NUMBER_OF_AUTHORS = 100
+POSTS_PER_AUTHOR = 10
+REQUESTS = 2000
+
+
+def _populate():
+    from tests.models import Author
+    from tests.models import Post
+
+    authors = Author.objects.bulk_create(
+        Author(name=f"author-{i}") for i in range(NUMBER_OF_AUTHORS)
+    )
+    Post.objects.bulk_create(
+        Post(title=f"post-{author.pk}-{i}", content=f"content-{i}", author=author)
+        for author in authors
+        for i in range(POSTS_PER_AUTHOR)
+    )
+
+
+def _per_request(func):
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        func(f"author-{i % NUMBER_OF_AUTHORS}")
+    return (time.perf_counter() - start) / REQUESTS
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    _django.add_db_arguments(parser)
+    args = parser.parse_args()
+    _django.setup(args)
+    _populate()
+
+    from django.db.models import Q
+    from tests.models import Author
+
+    from json_agg import CompiledQuery
+    from json_agg import JSONArrayAgg
+    from json_agg import JSONObjectAgg
+    from json_agg import Param
+
+    def _queryset(name):
+        return Author.objects.filter(name=name).annotate(
+            post_map=JSONObjectAgg(
+                "posts__title", "posts__content", filter=Q(posts__year__gte=2000)
+            ),
+            titles=JSONArrayAgg("posts__title", skip_null_values=True),
+        )
+
+    compiled = CompiledQuery(_queryset(Param("name")))
+
+    queryset = _per_request(lambda name: list(_queryset(name)))
+    compiled_query = _per_request(lambda name: compiled.execute(name=name))
+    print(f"{'queryset (ms)':>14} {'compiled (ms)':>14} {'saved (ms)':>11}")
+    print(
+        f"{queryset * 1000:>14.3f} {compiled_query * 1000:>14.3f} "
+        f"{(queryset - compiled_query) * 1000:>11.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
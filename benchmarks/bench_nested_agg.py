@@ -0,0 +1,106 @@
+"""Benchmark a nested JSONRowAgg tree against its prefetch_related equivalent.
+
+Usage: python -m benchmarks.bench_nested_agg [--db-vendor postgresql ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from benchmarks import _django
+
+
+POSTS_PER_AUTHOR = 10
+COMMENTS_PER_POST = 5
+NUMBER_OF_AUTHORS = (10, 100, 1000)
+
+
+def _populate(number_of_authors):
+    from django.utils import timezone
+    from tests.models import Author
+    from tests.models import Comment
+    from tests.models import Post
+
+    Author.objects.all().delete()
+    authors = Author.objects.bulk_create(
+        Author(name=f"author-{i}") for i in range(number_of_authors)
+    )
+    posts = Post.objects.bulk_create(
+        Post(title=f"post-{author.pk}-{i}", author=author)
+        for author in authors
+        for i in range(POSTS_PER_AUTHOR)
+    )
+    Comment.objects.bulk_create(
+        Comment(content=f"comment-{i}", created_at=timezone.now(), post=post)
+        for post in posts
+        for i in range(COMMENTS_PER_POST)
+    )
+
+
+def _best_of(func, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    _django.add_db_arguments(parser)
+    args = parser.parse_args()
+    _django.setup(args)
+
+    from django.db.models import OuterRef
+    from tests.models import Author
+    from tests.models import Comment
+
+    from json_agg import JSONAggSubquery
+    from json_agg import JSONRowAgg
+
+    def nested():
+        return [
+            {"name": author.name, "posts": author.posts_list}
+            for author in Author.objects.annotate(
+                posts_list=JSONRowAgg(
+                    title="posts__title",
+                    comments=JSONAggSubquery(
+                        Comment.objects.filter(post=OuterRef("posts")),
+                        JSONRowAgg(content="content", created_at="created_at"),
+                    ),
+                )
+            )
+        ]
+
+    def prefetch():
+        return [
+            {
+                "name": author.name,
+                "posts": [
+                    {
+                        "title": post.title,
+                        "comments": [
+                            {"content": c.content, "created_at": c.created_at}
+                            for c in post.comments.all()
+                        ],
+                    }
+                    for post in author.posts.all()
+                ],
+            }
+            for author in Author.objects.prefetch_related("posts__comments")
+        ]
+
+    print(f"{'authors':>8} {'JSONRowAgg (s)':>15} {'prefetch (s)':>13}")
+    for number_of_authors in NUMBER_OF_AUTHORS:
+        _populate(number_of_authors)
+        print(
+            f"{number_of_authors:>8} {_best_of(nested):>15.3f} "
+            f"{_best_of(prefetch):>13.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Benchmark parallel_decode against inline decoding.
+
+Each workload is decoded inline and in process pools of each number of workers,
+for growing payloads. The crossover is the smallest payload size from which the
+pool is faster than inline decoding: plain JSON decoding rarely pays for pickling
+payloads to workers, ``nested_output_field`` conversion (e.g., parsing datetimes)
+is the CPU bound work a pool can spread over cores.
+
+Usage: python -m benchmarks.bench_parallel_decode [--workers 2 4] [--db-vendor ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks import _django
+
+
+POSTS_PER_AUTHOR = 50
+NUMBER_OF_AUTHORS = (10, 50, 200, 1000, 4000)
+
+
+def _populate(number_of_authors):
+    from django.utils import timezone
+    from tests.models import Author
+    from tests.models import Post
+
+    Post.objects.all().delete()
+    Author.objects.all().delete()
+    authors = Author.objects.bulk_create(
+        Author(name=f"author-{i}") for i in range(number_of_authors)
+    )
+    now = timezone.now()
+    Post.objects.bulk_create(
+        (
+            Post(
+                title=f"post-{author.pk}-{i}",
+                year=1900 + i,
+                updated_at=now,
+                author=author,
+                metadata={f"key-{k}": f"value-{i}-{k}" for k in range(10)},
+            )
+            for author in authors
+            for i in range(POSTS_PER_AUTHOR)
+        ),
+        batch_size=5000,
+    )
+
+
+def _workloads():
+    from django.db.models import DateTimeField
+    from django.db.models import DecimalField
+
+    from json_agg import JSONArrayAgg
+    from json_agg import JSONObjectAgg
+
+    return {
+        "json": {
+            "post_map": JSONObjectAgg("posts__title", "posts__content"),
+            "metadata": JSONArrayAgg("posts__metadata", sqlite_func="json"),
+        },
+        "datetime": {
+            "dates": JSONArrayAgg(
+                "posts__updated_at", nested_output_field=DateTimeField()
+            ),
+        },
+        "decimal": {
+            "years": JSONArrayAgg(
+                "posts__year",
+                nested_output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+        },
+    }
+
+
+def _best_of(func, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _payload_size(queryset):
+    from json_agg._payloads import get_payloads
+    from json_agg._payloads import raw_payload_queryset
+
+    queryset, decoders = raw_payload_queryset(queryset)
+    payloads = get_payloads(list(queryset), decoders)
+    return sum(len(p) for values in payloads.values() for p in values if p)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    _django.add_db_arguments(parser)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=sorted({2, 4, os.cpu_count() or 1}),
+        help="numbers of worker processes to measure",
+    )
+    parser.add_argument(
+        "--number-of-authors", type=int, nargs="+", default=list(NUMBER_OF_AUTHORS)
+    )
+    args = parser.parse_args()
+    _django.setup(args)
+
+    from tests.models import Author
+
+    from json_agg import parallel_decode
+
+    executors = {
+        workers: ProcessPoolExecutor(max_workers=workers) for workers in args.workers
+    }
+    # smallest payload size (in MiB) where the pool is faster, per workload/workers
+    crossovers = {}
+    print(f"{os.cpu_count()} CPUs")
+    print(
+        f"{'workload':>9} {'authors':>8} {'payload (MiB)':>14} {'inline (s)':>11} "
+        + " ".join(f"{f'pool x{w} (s)':>13}" for w in args.workers)
+    )
+    try:
+        for number_of_authors in args.number_of_authors:
+            _populate(number_of_authors)
+            for workload, aggregates in _workloads().items():
+                queryset = Author.objects.annotate(**aggregates)
+                size = _payload_size(queryset) / 2**20
+                inline = _best_of(lambda q=queryset: parallel_decode(q))
+                pools = []
+                for workers, executor in executors.items():
+                    # warm up the pool so process start up isn't measured
+                    parallel_decode(queryset, threshold=0, executor=executor)
+                    pool = _best_of(
+                        lambda q=queryset, e=executor: parallel_decode(
+                            q, threshold=0, executor=e
+                        )
+                    )
+                    pools.append(pool)
+                    if pool < inline:
+                        crossovers.setdefault((workload, workers), size)
+                print(
+                    f"{workload:>9} {number_of_authors:>8} {size:>14.2f} "
+                    f"{inline:>11.3f} " + " ".join(f"{p:>13.3f}" for p in pools)
+                )
+    finally:
+        for executor in executors.values():
+            executor.shutdown()
+
+    print("\ncrossover (MiB of payloads from which the pool is faster)")
+    for workload in _workloads():
+        print(
+            f"{workload:>9} "
+            + " ".join(
+                f"x{w}: "
+                + (
+                    f"{crossovers[workload, w]:.2f}"
+                    if (workload, w) in crossovers
+                    else "none"
+                )
+                for w in args.workers
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Load test JSON aggregate querysets under concurrency.
+
+Every worker (a thread or a process, each with its own database connection)
+evaluates pages of authors annotated with JSONObjectAgg and JSONArrayAgg for a
+fixed duration. Throughput, latency percentiles and client CPU time per request
+are reported for each group size and concurrency level: latency growing while CPU
+time per request stays flat points at the database (or, with threads, the GIL),
+CPU time growing points at decoding. SQLite runs on a file in WAL mode so readers
+don't block each other.
+
+Usage: python -m benchmarks.loadtest [--mode processes] [--db-vendor postgresql ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import _django
+
+
+NUMBER_OF_AUTHORS = 200
+PAGE_SIZE = 10
+
+
+def _populate(group_size):
+    from django.db import connection
+    from tests.models import Author
+    from tests.models import Post
+
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+    Post.objects.all().delete()
+    Author.objects.all().delete()
+    authors = Author.objects.bulk_create(
+        Author(name=f"author-{i}") for i in range(NUMBER_OF_AUTHORS)
+    )
+    Post.objects.bulk_create(
+        (
+            Post(title=f"post-{author.pk}-{i}", content=f"content-{i}", author=author)
+            for author in authors
+            for i in range(group_size)
+        ),
+        batch_size=5000,
+    )
+
+
+def _request(offset):
+    from tests.models import Author
+
+    from json_agg import JSONArrayAgg
+    from json_agg import JSONObjectAgg
+
+    queryset = Author.objects.order_by("pk").annotate(
+        post_map=JSONObjectAgg("posts__title", "posts__content"),
+        years=JSONArrayAgg("posts__year"),
+    )
+    return list(queryset[offset : offset + PAGE_SIZE])
+
+
+def _init_process(args):
+    from django.conf import settings
+
+    # with the "spawn" start method, processes start from scratch
+    if not settings.configured:
+        _django.configure(args)
+
+
+def _worker(duration):
+    from django.db import connection
+
+    rng = random.Random()  # noqa: S311
+    offsets = range(0, NUMBER_OF_AUTHORS - PAGE_SIZE + 1, PAGE_SIZE)
+    try:
+        _request(0)  # warm up the connection
+        latencies = []
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        end = start + duration
+        while (now := time.perf_counter()) < end:
+            _request(rng.choice(offsets))
+            latencies.append(time.perf_counter() - now)
+        return latencies, time.perf_counter() - start, time.thread_time() - cpu_start
+    finally:
+        connection.close()
+
+
+def _run(args, concurrency):
+    from django.db import connections
+
+    # don't share connections with forked processes
+    connections.close_all()
+    if args.mode == "threads":
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=concurrency, initializer=_init_process, initargs=(args,)
+        )
+    with executor:
+        results = list(executor.map(_worker, [args.duration] * concurrency))
+    latencies = sorted(latency for worker, _, _ in results for latency in worker)
+    throughput = sum(len(worker) / elapsed for worker, elapsed, _ in results)
+    cpu_per_request = sum(cpu for _, _, cpu in results) / len(latencies)
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return throughput, percentiles[49], percentiles[98], cpu_per_request
+
+
+def main():
+    """Run the load test."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    _django.add_db_arguments(parser)
+    parser.add_argument("--mode", choices=("threads", "processes"), default="threads")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--group-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument(
+        "--duration", type=float, default=5.0, help="seconds per measurement"
+    )
+    args = parser.parse_args()
+    _django.setup(args)
+
+    print(
+        f"{args.mode} on {args.db_vendor}, {PAGE_SIZE} authors per request\n"
+        f"{'group size':>10} {'workers':>7} {'req/s':>9} {'p50 (ms)':>9} "
+        f"{'p99 (ms)':>9} {'cpu/req (ms)':>12}"
+    )
+    for group_size in args.group_sizes:
+        _populate(group_size)
+        for concurrency in args.concurrency:
+            throughput, p50, p99, cpu = _run(args, concurrency)
+            print(
+                f"{group_size:>10} {concurrency:>7} {throughput:>9.1f} "
+                f"{p50 * 1000:>9.2f} {p99 * 1000:>9.2f} {cpu * 1000:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 """Nox sessions."""
 
+from __future__ import annotations
+
 import os
 import shlex
 import shutil
@@ -148,25 +150,33 @@ def safety(session: Session) -> None:
     session.run("safety", "check", "--full-report", f"--file={requirements}")
 
 
-@session(python=python_versions)
-@nox.parametrize("database", ["sqlite", "postgresql"])
-def tests(session: Session, database: str) -> None:
-    """Run the test suite."""
-    dependencies = TEST_DEPENDENCIES.copy()
+def _db_args(session: Session, database: str) -> list[str]:
+    """Return the database arguments of the test and benchmark runners.
 
+    The PostgreSQL driver is installed when needed, and the session is skipped
+    when no PostgreSQL password is provided.
+    """
     db_args = [f"--db-vendor={database}"]
 
     if database == "postgresql":
-        dependencies.append("psycopg2")
         if not os.getenv("POSTGRESQL_PASSWORD"):
             session.skip("no postgresql password provided. skipping...")
+        session.install("psycopg2")
         for setting in ["name", "user", "password", "host", "port"]:
             value = os.getenv(f"postgresql_{setting}".upper())
             if value:
                 db_args.append(f"--db-{setting}={value}")
 
+    return db_args
+
+
+@session(python=python_versions)
+@nox.parametrize("database", ["sqlite", "postgresql"])
+def tests(session: Session, database: str) -> None:
+    """Run the test suite."""
+    db_args = _db_args(session, database)
     session.install(".")
-    session.install(*dependencies)
+    session.install(*TEST_DEPENDENCIES)
 
     try:
         session.run(
@@ -177,6 +187,30 @@ def tests(session: Session, database: str) -> None:
             session.notify("coverage", posargs=[])
 
 
+@session(python=python_versions[0])
+@nox.parametrize("database", ["sqlite", "postgresql"])
+def benchmarks(session: Session, database: str) -> None:
+    """Run the benchmarks."""
+    db_args = _db_args(session, database)
+    session.install(".")
+
+    modules = session.posargs or sorted(
+        f"benchmarks.{path.stem}" for path in Path("benchmarks").glob("bench_*.py")
+    )
+    for module in modules:
+        session.run("python", "-m", module, *db_args)
+
+
+@session(python=python_versions[0])
+@nox.parametrize("database", ["sqlite", "postgresql"])
+def loadtest(session: Session, database: str) -> None:
+    """Run the concurrent load test."""
+    db_args = _db_args(session, database)
+    session.install(".")
+
+    session.run("python", "-m", "benchmarks.loadtest", *db_args, *session.posargs)
+
+
 @session(python=python_versions[0])
 def coverage(session: Session) -> None:
     """Produce the coverage report."""
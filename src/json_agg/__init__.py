@@ -1,7 +1,38 @@
 """Django JSON Agg."""
 
+from .aggregates import JSONAggHash
+from .aggregates import JSONAggSubquery
 from .aggregates import JSONArrayAgg
 from .aggregates import JSONObjectAgg
+from .aggregates import JSONRowAgg
+from .asynchronous import aiter_decoded
+from .chunking import iter_json_agg_chunks
+from .chunking import iter_json_agg_groups
+from .compiled import CompiledQuery
+from .compiled import Param
+from .decoders import register_decoder
+from .diagnostics import explain
+from .fanout import fan_out
+from .grouping import annotate_json
+from .parallel import parallel_decode
+from .prefetch import prefetch_json_agg
 
 
-__all__ = ["JSONArrayAgg", "JSONObjectAgg"]
+__all__ = [
+    "CompiledQuery",
+    "JSONAggHash",
+    "JSONAggSubquery",
+    "JSONArrayAgg",
+    "JSONObjectAgg",
+    "JSONRowAgg",
+    "Param",
+    "aiter_decoded",
+    "annotate_json",
+    "explain",
+    "fan_out",
+    "iter_json_agg_chunks",
+    "iter_json_agg_groups",
+    "parallel_decode",
+    "prefetch_json_agg",
+    "register_decoder",
+]
@@ -0,0 +1,100 @@
+"""Helpers to add conditions to the ON clause of existing joins."""
+
+from __future__ import annotations
+
+import weakref
+from typing import Any
+from typing import Iterator
+
+from django.db.models import Subquery
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.expressions import Col
+from django.db.models.sql.constants import LOUTER
+from django.db.models.sql.datastructures import Join
+from django.db.models.sql.query import Query
+
+
+class ConditionalJoin(Join):
+    """Join adding ``condition`` to the ON clause of ``join``.
+
+    The condition only applies when compiled by ``compiler``, and ``join`` is put
+    back in the query alias_map as soon as it's compiled, so this never outlives
+    a single compilation (and never leaks into clones or later compilations).
+    """
+
+    def __init__(self, join: Join, condition: Any, compiler: Any):
+        self.__dict__.update(join.__dict__)
+        self.join = join
+        self.condition = condition
+        self.compiler_ref = weakref.ref(compiler)
+
+    @property
+    def identity(self):
+        """Identity of the wrapped join, so it can be reused as usual."""
+        return self.join.identity
+
+    def relabeled_clone(self, change_map):
+        """Relabel the wrapped join, dropping the extra condition."""
+        return self.join.relabeled_clone(change_map)
+
+    def as_sql(self, compiler, connection):
+        """Compile the wrapped join with the extra condition."""
+        compiler.query.alias_map[self.table_alias] = self.join
+        sql, params = self.join.as_sql(compiler, connection)
+        if compiler is not self.compiler_ref():
+            return sql, params
+        condition_sql, condition_params = compiler.compile(self.condition)
+        # sql ends with the closing parenthesis of the ON clause
+        return f"{sql[:-1]} AND ({condition_sql}))", [*params, *condition_params]
+
+
+def get_outer_join(query: Query, alias: str) -> Join | None:
+    """Get the LEFT OUTER join for ``alias``, unwrapping stale ConditionalJoins."""
+    join = query.alias_map.get(alias)
+    if isinstance(join, ConditionalJoin):
+        join = join.join
+    if not isinstance(join, Join) or join.join_type != LOUTER:
+        return None
+    return join
+
+
+def is_alias_used_elsewhere(query: Query, alias: str, expression: Any) -> bool:
+    """Tell whether anything in ``query`` but ``expression`` may use ``alias``.
+
+    This errs on the side of caution: subqueries, extra() and related lookups in
+    order_by are all considered as users of the alias.
+    """
+    if query.extra or query.extra_order_by or query.distinct_fields:
+        return True
+    if any(join.parent_alias == alias for join in query.alias_map.values()):
+        return True
+    if any(isinstance(field, str) and LOOKUP_SEP in field for field in query.order_by):
+        return True
+    others = [
+        *(a for a in query.annotations.values() if a is not expression),
+        *(o for o in query.order_by if not isinstance(o, str)),
+        *query.select,
+        query.where,
+    ]
+    if isinstance(query.group_by, tuple):
+        others.extend(query.group_by)
+    return any(
+        isinstance(node, (Subquery, Query))
+        or (isinstance(node, Col) and node.alias == alias)
+        for other in others
+        for node in walk(other)
+    )
+
+
+def walk(node: Any) -> Iterator[Any]:
+    """Yield ``node`` and all expressions (or where nodes) under it."""
+    yield node
+    if hasattr(node, "children"):  # WhereNode
+        children = node.children
+    elif hasattr(node, "get_source_expressions"):
+        children = node.get_source_expressions()
+    else:
+        children = []
+    for child in children:
+        if child is not None:
+            yield from walk(child)
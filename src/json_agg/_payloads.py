@@ -0,0 +1,117 @@
+"""Helpers to fetch JSON aggregates as raw payloads and decode them later."""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from django.db.models import Field
+from django.db.models import QuerySet
+
+from ._rows import check_rows
+from ._rows import get_value
+from ._rows import set_value
+from .aggregates import JSONAggregateMixin
+from .aggregates import JSONObjectAgg
+from .aggregates import JSONRowAgg
+from .decoders import get_decoder
+
+
+class PayloadDecoder:
+    """Picklable equivalent of JSON aggregates db converters."""
+
+    def __init__(
+        self, is_object: bool, field: Field | None, key_field: Field | None = None
+    ):
+        self.is_object = is_object
+        self.field = field
+        self.key_field = key_field
+        self.convert = get_decoder(field) if field is not None else None
+        self.convert_keys = get_decoder(key_field) if key_field is not None else None
+
+    def __reduce__(self):
+        # decoders are closures, rebuild them from the fields
+        return self.__class__, (self.is_object, self.field, self.key_field)
+
+    @classmethod
+    def for_aggregate(cls, aggregate: JSONAggregateMixin) -> PayloadDecoder | None:
+        """Get a decoder for ``aggregate``, if it doesn't require a db connection."""
+        field = aggregate.nested_output_field
+        if field is not None and hasattr(field, "from_db_value"):
+            return None
+        # row values are converted per key, by expressions resolved in the query
+        if isinstance(aggregate, JSONRowAgg):
+            return None
+        is_object = isinstance(aggregate, JSONObjectAgg)
+        return cls(
+            is_object=is_object,
+            field=field,
+            key_field=aggregate.key_output_field if is_object else None,
+        )
+
+    def decode(self, payload: str | None) -> Any:
+        """Decode a raw payload."""
+        if self.is_object:
+            if not payload:
+                return {}
+            value = json.loads(payload)
+            if self.convert is None and self.convert_keys is None:
+                return value
+            keys = value.keys()
+            if self.convert_keys is not None:
+                keys = self.convert_keys(list(keys))
+            values = value.values()
+            if self.convert is not None:
+                values = self.convert(list(values))
+            return dict(zip(keys, values))
+        if payload is None:
+            return None if self.convert is None else []
+        value = json.loads(payload)
+        if self.convert is None:
+            return value
+        return self.convert(value)
+
+    def decode_many(self, payloads: list[str | None]) -> list[Any]:
+        """Decode a list of raw payloads."""
+        return [self.decode(payload) for payload in payloads]
+
+
+def raw_payload_queryset(
+    queryset: QuerySet,
+) -> tuple[QuerySet, dict[str, PayloadDecoder]]:
+    """Clone ``queryset`` so JSON aggregates are fetched as raw payloads.
+
+    Aggregates requiring a database connection for conversion are left untouched.
+
+    Raises:
+        ValueError: if rows aren't model instances or ``values()`` dicts.
+    """
+    check_rows(queryset)
+    queryset = queryset.all()
+    query = queryset.query
+    decoders = {}
+    for name, annotation in query.annotation_select.items():
+        if not isinstance(annotation, JSONAggregateMixin):
+            continue
+        decoder = PayloadDecoder.for_aggregate(annotation)
+        if decoder is None:
+            continue
+        raw_annotation = annotation.copy()
+        raw_annotation._raw_payload = True
+        query.annotations[name] = raw_annotation
+        decoders[name] = decoder
+    # reset annotation_select cache
+    query.set_annotation_mask(query.annotation_select_mask)
+    return queryset, decoders
+
+
+def get_payloads(rows: list[Any], decoders: dict[str, PayloadDecoder]):
+    """Get raw payloads from ``rows``, per annotation name."""
+    return {name: [get_value(row, name) for row in rows] for name in decoders}
+
+
+def set_decoded(rows: list[Any], decoded: dict[str, list[Any]]):
+    """Set decoded values, per annotation name, on ``rows``."""
+    for name, values in decoded.items():
+        for row, value in zip(rows, values):
+            set_value(row, name, value)
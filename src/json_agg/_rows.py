@@ -0,0 +1,34 @@
+"""Helpers to read and write values on queryset rows."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from django.db.models import QuerySet
+from django.db.models.query import ModelIterable
+from django.db.models.query import ValuesIterable
+
+
+def check_rows(queryset: QuerySet):
+    """Ensure ``queryset`` rows are model instances or ``values()`` dicts.
+
+    Raises:
+        ValueError: for other rows (e.g., ``values_list()`` tuples).
+    """
+    if queryset._iterable_class not in (ModelIterable, ValuesIterable):
+        raise ValueError("Only model instances and values() rows are supported.")
+
+
+def get_value(row: Any, name: str) -> Any:
+    """Get ``name`` from a model instance or a ``values()`` row."""
+    if isinstance(row, dict):
+        return row[name]
+    return getattr(row, name)
+
+
+def set_value(row: Any, name: str, value: Any):
+    """Set ``name`` on a model instance or a ``values()`` row."""
+    if isinstance(row, dict):
+        row[name] = value
+    else:
+        setattr(row, name, value)
@@ -3,54 +3,250 @@
 from __future__ import annotations
 
 import abc
+import json
 from functools import partial
 from typing import Any
+from typing import ClassVar
 
+from django.core.exceptions import FieldDoesNotExist
+from django.db import NotSupportedError
 from django.db import connection
 from django.db.models import Aggregate
+from django.db.models import CharField
+from django.db.models import F
 from django.db.models import Field
 from django.db.models import Func
 from django.db.models import JSONField
+from django.db.models import Model
 from django.db.models import Q
+from django.db.models import QuerySet
+from django.db.models import Subquery
+from django.db.models import TextField
+from django.db.models import Value
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.expressions import Col
+from django.db.models.functions import Cast
+from django.db.models.functions import JSONObject
+from django.db.models.lookups import IsNull
+
+from ._joins import ConditionalJoin
+from ._joins import get_outer_join
+from ._joins import is_alias_used_elsewhere
+from .decoders import get_decoder
+
+
+class _SQLiteStripNulls(Func):
+    """Remove object members with a null value, at any depth, from JSON values.
+
+    Aggregates can't be used in subqueries on SQLite, so values are stripped one by
+    one before being aggregated.
+    """
+
+    template = (
+        "JSON((WITH RECURSIVE"
+        " nulls(n, path) AS (SELECT ROW_NUMBER() OVER (), fullkey"
+        " FROM JSON_TREE(%(expression)s)"
+        " WHERE type = 'null' AND fullkey NOT LIKE '%%%%]'),"
+        " stripped(i, doc) AS (SELECT 0, %(expression)s UNION ALL"
+        " SELECT i + 1, JSON_REMOVE(doc, (SELECT path FROM nulls WHERE n = i + 1))"
+        " FROM stripped WHERE i < (SELECT COUNT(*) FROM nulls))"
+        " SELECT doc FROM stripped ORDER BY i DESC LIMIT 1))"
+    )
+
+    def as_sql(self, compiler, connection, **extra_context):
+        """Override Func.as_sql as the expression is used twice."""
+        (expression,) = self.get_source_expressions()
+        sql, params = compiler.compile(expression)
+        return self.template % {"expression": sql}, (*params, *params)
+
+
+class _JSONProjection(Func):
+    """Rebuild a JSON object with only the given (dotted) paths of a JSON value."""
+
+    output_field = JSONField()
+
+    def __init__(self, expression: Any, keys: list[str]):
+        if isinstance(keys, str) or not keys:
+            raise ValueError("'keys' must be a non-empty list of JSON paths.")
+        self.tree = {}
+        for key in keys:
+            *parents, name = key.split(".")
+            node = self.tree
+            for parent in parents:
+                node = node.setdefault(parent, {})
+                if node is None:
+                    raise ValueError(f"Overlapping JSON paths in 'keys' ({key}).")
+            if name in node:
+                raise ValueError(f"Overlapping JSON paths in 'keys' ({key}).")
+            node[name] = None
+        super().__init__(expression)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        """Project paths with JSON_OBJECT and the -> operator."""
+        # "->" keeps JSON types (e.g., booleans) but requires SQLite 3.38
+        if connection.Database.sqlite_version_info >= (3, 38):
+            template = "(%s -> %%s)"
+        else:  # pragma: no cover
+            template = "JSON_EXTRACT(%s, %%s)"
+
+        def extract(value_sql, path):
+            json_path = "$" + "".join(f".{json.dumps(name)}" for name in path)
+            return template % value_sql, [json_path]
+
+        return self._compile(
+            compiler, "JSON_OBJECT", "%s", extract, "COALESCE(JSON_TYPE(%s), 'null')"
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        """Project paths with JSONB_BUILD_OBJECT and the -> operator."""
+
+        def extract(value_sql, path):
+            return f"({value_sql}{' -> %s::text' * len(path)})", list(path)
+
+        return self._compile(
+            compiler,
+            "JSONB_BUILD_OBJECT",
+            "%s::text",
+            extract,
+            "COALESCE(JSONB_TYPEOF(%s), 'null')",
+        )
+
+    def _compile(self, compiler, object_function, key_placeholder, extract, type_of):
+        (expression,) = self.get_source_expressions()
+        value_sql, value_params = compiler.compile(expression)
+
+        def build(node, path):
+            sql = []
+            params = []
+            for name, child in node.items():
+                if child is None:
+                    child_sql, child_params = extract(value_sql, [*path, name])
+                    child_params = [*value_params, *child_params]
+                else:
+                    child_sql, child_params = build(child, [*path, name])
+                sql.append(f"{key_placeholder}, {child_sql}")
+                params.extend([name, *child_params])
+            return f"{object_function}({', '.join(sql)})", params
+
+        # null values (SQL or JSON) stay null rather than becoming objects of nulls
+        object_sql, object_params = build(self.tree, [])
+        type_sql = type_of % value_sql
+        return (
+            f"CASE WHEN {type_sql} = 'null' THEN NULL ELSE {object_sql} END",
+            [*value_params, *object_params],
+        )
 
 
 class JSONAggregateMixin(abc.ABC):
     """Mixin for JSON aggregators."""
 
+    # aggregate function name per database vendor
+    vendor_functions: ClassVar[dict[str, str]] = {}
+    # position of the value expression in source expressions
+    value_index: ClassVar[int] = 0
+    # when set, values are returned as fetched from the database (raw JSON text)
+    _raw_payload = False
+
     @abc.abstractmethod
     def _convert_nested_value(self, value: Any, converter: callable):
-        """Convert nested values."""
+        """Convert nested values, ``converter`` taking and returning a list."""
 
     def __init__(
         self,
         *args,
         nested_output_field: Field = None,
+        strip_nulls: bool = False,
         **kwargs,
     ):
         if nested_output_field and not isinstance(nested_output_field, Field):
             raise ValueError("'nested_output_field' must be a Django model Field.")
         self.nested_output_field = nested_output_field
+        self.strip_nulls = strip_nulls
         super().__init__(*args, **kwargs)
 
+    @staticmethod
+    def _not_null(expression: Any) -> Q:
+        if isinstance(expression, str):
+            return Q(**{f"{expression}__isnull": False})
+        return Q(IsNull(expression, False))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        """Override Aggregate.as_sql to pick the function for the database vendor."""
+        try:
+            function = self.vendor_functions[connection.vendor]
+        except KeyError:
+            raise NotSupportedError(
+                f"{self.__class__.__name__} is not supported on "
+                f"'{connection.vendor}'. Consider json_agg.annotate_json with the "
+                "python strategy."
+            ) from None
+        if self.strip_nulls and connection.vendor == "sqlite":
+            return super(JSONAggregateMixin, self._sqlite_strip_nulls()).as_sql(
+                compiler, connection, function=function, **extra_context
+            )
+        sql, params = super().as_sql(
+            compiler, connection, function=function, **extra_context
+        )
+        if self.strip_nulls and connection.vendor == "postgresql":
+            sql = f"JSONB_STRIP_NULLS({sql})"
+        return sql, params
+
+    def _sqlite_strip_nulls(self):
+        clone = self.copy()
+        expressions = clone.get_source_expressions()
+        value = expressions[self.value_index]
+        # other values can't contain objects
+        if isinstance(value.output_field, JSONField):
+            expressions[self.value_index] = _SQLiteStripNulls(value)
+            clone.set_source_expressions(expressions)
+        return clone
+
+    def _rows_filter(self, model: type[Model]) -> Any:
+        """Get the filter of aggregated rows, when aggregating over ``model``."""
+        return self.filter
+
     def _nested_db_converter(self, value, expression, connection, db_converter):
-        converter = partial(db_converter, expression=expression, connection=connection)
+        def converter(values):
+            return [db_converter(v, expression, connection) for v in values]
+
         return self._convert_nested_value(value, converter)
 
-    def _nested_to_python(self, value, expression, connection):
-        return self._convert_nested_value(value, self.nested_output_field.to_python)
+    def _decoded_to_python(self, value, expression, connection, convert):
+        return convert(value)
 
     def get_db_converters(self, connection: Any) -> list[callable[..., Any]]:
         """Override Django's BaseExpression method to handle nested output fields."""
-        converters = super().get_db_converters(connection)
-        if not self.nested_output_field:
-            return converters
-        return (
-            converters
-            + [
+        if self._raw_payload:
+            return []
+        return [
+            *super().get_db_converters(connection),
+            *self._decoded_db_converters(connection),
+        ]
+
+    def _decoded_db_converters(self, connection: Any) -> list[callable[..., Any]]:
+        """Get the db converters of values already decoded from JSON."""
+        converters = []
+        if self.nested_output_field:
+            converters += [
                 partial(self._nested_db_converter, db_converter=c)
                 for c in self.nested_output_field.get_db_converters(connection)
             ]
-            + [self._nested_to_python]
+        convert = self._decoded_converter()
+        if convert is None:
+            return converters
+        return [*converters, partial(self._decoded_to_python, convert=convert)]
+
+    def _decoded_converter(self) -> callable | None:
+        """Get a function converting values already decoded from JSON, if needed.
+
+        This is the last db converter, and the only conversion when the aggregate
+        is nested in another JSON value, where db converters don't apply.
+        """
+        if not self.nested_output_field:
+            return None
+        return partial(
+            self._convert_nested_value,
+            converter=get_decoder(self.nested_output_field),
         )
 
 
@@ -66,31 +262,56 @@ class JSONObjectAgg(JSONAggregateMixin, Aggregate):
             This is particularly useful when "Cast" is not supported.
         nested_output_field: Django's model Field representing values inside the
             json.
+        push_key_filter: If True, also add the non-null key condition to the ON
+            clause of the join the keys come from, so rows with null keys can be
+            skipped early (and indexes used). This only happens when it's safe,
+            i.e., when nothing else in the query uses that join.
+        key_output_field: Django's model Field representing keys, which are
+            strings in JSON. Keys are converted in the same pass as values.
+        skip_null_values: If True, rows with a null value are skipped, i.e., the
+            object has no member for them.
+        strip_nulls: If True, object members with a null value are removed by the
+            database, at any depth of JSON values. Null values are skipped too.
+        keys: If provided, JSON values are projected to objects with only these
+            paths (dots separating nested keys, e.g., ["a", "b.c"]) by the database.
         **kwargs: same as the ones available in django's Aggregate.
     """
 
     template = "%(function)s(%(expressions)s)"
     output_field = JSONField(default=dict)
+    vendor_functions: ClassVar[dict[str, str]] = {
+        "sqlite": "JSON_GROUP_OBJECT",
+        "postgresql": "JSONB_OBJECT_AGG",
+    }
+    value_index = 1
 
     def __init__(
         self,
         name_expression: Any,
         value_expression: Any,
+        push_key_filter: bool = False,
+        skip_null_values: bool = False,
+        key_output_field: Field = None,
+        keys: list[str] | None = None,
         **kwargs,
     ):
-        self.function = {
-            "sqlite": "JSON_GROUP_OBJECT",
-            "postgresql": "JSONB_OBJECT_AGG",
-        }[connection.vendor]
+        if key_output_field and not isinstance(key_output_field, Field):
+            raise ValueError("'key_output_field' must be a Django model Field.")
+        self.key_output_field = key_output_field
+        self.push_key_filter = push_key_filter
+        # key can't be NULL, so lets exclude it
+        not_null_filter = Q(**{f"{name_expression}__isnull": False})
+        if skip_null_values or kwargs.get("strip_nulls"):
+            not_null_filter &= self._not_null(value_expression)
+        if keys is not None:
+            value_expression = _JSONProjection(value_expression, keys)
         if vendor_func := kwargs.get(f"{connection.vendor}_func"):
             value_expression = Func(value_expression, function=vendor_func)
-        # key can't be NULL, so lets exclude it
-        not_null_key_filter = Q(**{f"{name_expression}__isnull": False})
         filters = kwargs.pop("filter", None)
         if not filters:
-            filters = not_null_key_filter
+            filters = not_null_filter
         else:
-            filters = filters & not_null_key_filter
+            filters = filters & not_null_filter
         super().__init__(
             name_expression,
             value_expression,
@@ -98,10 +319,47 @@ class JSONObjectAgg(JSONAggregateMixin, Aggregate):
             **kwargs,
         )
 
+    def as_sql(self, compiler, connection, **extra_context):
+        """Override Aggregate.as_sql to push the non-null key filter to the join."""
+        if self.push_key_filter:
+            self._push_key_filter(compiler)
+        return super().as_sql(compiler, connection, **extra_context)
+
+    def _push_key_filter(self, compiler):
+        key = self.get_source_expressions()[0]
+        query = compiler.query
+        # only selected annotations are compiled before the FROM clause
+        if not isinstance(key, Col) or not any(
+            annotation is self for annotation in query.annotation_select.values()
+        ):
+            return
+        join = get_outer_join(query, key.alias)
+        if join is None or is_alias_used_elsewhere(query, key.alias, self):
+            return
+        query.alias_map[key.alias] = ConditionalJoin(join, IsNull(key, False), compiler)
+
     def _convert_nested_value(self, value, converter):
         if not value:
             return {}
-        return {k: converter(v) for k, v in value.items()}
+        return dict(zip(value.keys(), converter(list(value.values()))))
+
+    def _decoded_converter(self):
+        if not self.key_output_field:
+            return super()._decoded_converter()
+        convert_keys = get_decoder(self.key_output_field)
+        convert_values = (
+            get_decoder(self.nested_output_field) if self.nested_output_field else None
+        )
+
+        def convert(value):
+            if not value:
+                return {}
+            values = value.values()
+            if convert_values is not None:
+                values = convert_values(list(values))
+            return dict(zip(convert_keys(list(value)), values))
+
+        return convert
 
     @property
     def convert_value(self) -> callable:
@@ -126,17 +384,34 @@ class JSONArrayAgg(JSONAggregateMixin, Aggregate):
             This is particularly useful when "Cast" is not supported.
         nested_output_field: Django's model Field representing values inside the
             json.
+        skip_null_values: If True, null values are skipped.
+        strip_nulls: If True, object members with a null value are removed by the
+            database, at any depth of JSON values. Null elements of arrays are kept.
+        keys: If provided, JSON values are projected to objects with only these
+            paths (dots separating nested keys, e.g., ["a", "b.c"]) by the database.
         **kwargs: same as the ones available in django's Aggregate.
     """
 
     template = "%(function)s(%(expressions)s)"
     output_field = JSONField(default=list)
+    vendor_functions: ClassVar[dict[str, str]] = {
+        "sqlite": "JSON_GROUP_ARRAY",
+        "postgresql": "JSONB_AGG",
+    }
 
-    def __init__(self, expression: Any, **kwargs):
-        self.function = {
-            "sqlite": "JSON_GROUP_ARRAY",
-            "postgresql": "JSONB_AGG",
-        }[connection.vendor]
+    def __init__(
+        self,
+        expression: Any,
+        skip_null_values: bool = False,
+        keys: list[str] | None = None,
+        **kwargs,
+    ):
+        if skip_null_values:
+            not_null_filter = self._not_null(expression)
+            filters = kwargs.pop("filter", None)
+            kwargs["filter"] = filters & not_null_filter if filters else not_null_filter
+        if keys is not None:
+            expression = _JSONProjection(expression, keys)
         if vendor_func := kwargs.get(f"{connection.vendor}_func"):
             expression = Func(expression, function=vendor_func)
         super().__init__(expression, **kwargs)
@@ -144,4 +419,219 @@ class JSONArrayAgg(JSONAggregateMixin, Aggregate):
     def _convert_nested_value(self, value, converter):
         if not value:  # pragma: no cover
             return []
-        return [converter(v) for v in value]
+        return converter(value)
+
+
+class JSONRowAgg(JSONArrayAgg):
+    """Aggregate rows as a JSON array of objects.
+
+    Row values are converted with the output field of their expression, so there's
+    no need for ``nested_output_field``. Rows can nest their own JSON aggregates with
+    JSONAggSubquery, converted the same way at each level. When all fields follow
+    the same multi-valued relation (e.g., "posts__title" and "posts__content"),
+    rows where the relation is null (i.e., no related objects) are skipped.
+
+    Args:
+        filter: same as the one available in django's Aggregate.
+        **fields: expressions of row values, per JSON key. Keys can't be names of
+            other aggregate options (e.g., "distinct" or "strip_nulls"), which
+            aren't supported.
+    """
+
+    # options of other aggregates, which would silently become row members
+    _option_names: ClassVar[frozenset[str]] = frozenset(
+        {
+            "default",
+            "distinct",
+            "keys",
+            "nested_output_field",
+            "postgresql_func",
+            "skip_null_values",
+            "sqlite_func",
+            "strip_nulls",
+        }
+    )
+
+    def __init__(self, filter: Any = None, **fields: Any):
+        if not fields:
+            raise ValueError("JSONRowAgg requires at least one field.")
+        if options := sorted(self._option_names.intersection(fields)):
+            raise ValueError(
+                f"JSONRowAgg doesn't support {', '.join(map(repr, options))}: "
+                "row keys can't be aggregate option names."
+            )
+        super().__init__(JSONObject(**fields), filter=filter)
+
+    def resolve_expression(
+        self, query=None, allow_joins=True, reuse=None, summarize=False, for_save=False
+    ):
+        """Override Aggregate.resolve_expression to skip missing related rows."""
+        c = self
+        if query is not None and self._relation_path(query.model):
+            c = self.copy()
+            c.filter = self._rows_filter(query.model)
+        return super(JSONRowAgg, c).resolve_expression(
+            query, allow_joins, reuse, summarize, for_save
+        )
+
+    def _rows_filter(self, model):
+        relation = self._relation_path(model)
+        if not relation:
+            return self.filter
+        not_null_filter = Q(**{f"{relation}__isnull": False})
+        return self.filter & not_null_filter if self.filter else not_null_filter
+
+    def _relation_path(self, model):
+        paths = []
+        for expression in self._row_expressions().values():
+            # resolved expressions (and outer references) are left untouched
+            if type(expression) is not F:
+                continue
+            names = expression.name.split(LOOKUP_SEP)
+            path = []
+            opts = model._meta
+            for i, name in enumerate(names):
+                try:
+                    field = opts.get_field(name)
+                except FieldDoesNotExist:
+                    break
+                if not field.is_relation:
+                    break
+                if field.one_to_many or field.many_to_many:
+                    path = names[: i + 1]
+                opts = field.related_model._meta
+            paths.append(path)
+        if not paths:
+            return None
+        common_path = []
+        for names in zip(*paths):
+            if len(set(names)) > 1:
+                break
+            common_path.append(names[0])
+        return LOOKUP_SEP.join(common_path)
+
+    def _row_expressions(self):
+        json_object = self.get_source_expressions()[0]
+        expressions = json_object.get_source_expressions()
+        return {
+            key.value: value for key, value in zip(expressions[::2], expressions[1::2])
+        }
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        """Embed JSON values as JSON, instead of text, on SQLite."""
+        clone = self.copy()
+        expressions = clone.get_source_expressions()
+        expressions[0] = self._sqlite_json_object(expressions[0])
+        clone.set_source_expressions(expressions)
+        return super(JSONRowAgg, clone).as_sql(compiler, connection, **extra_context)
+
+    @staticmethod
+    def _sqlite_json_object(json_object):
+        json_object = json_object.copy()
+        json_object.set_source_expressions(
+            [
+                Func(e, function="JSON", output_field=e.output_field)
+                if isinstance(getattr(e, "_output_field_or_none", None), JSONField)
+                else e
+                for e in json_object.get_source_expressions()
+            ]
+        )
+        return json_object
+
+    def _decoded_converter(self):
+        decoders = {}
+        for key, expression in self._row_expressions().items():
+            if isinstance(expression, JSONAggSubquery):
+                decoder = _batch(expression.aggregate._decoded_converter())
+            else:
+                field = expression._output_field_or_none
+                if field is None or type(field).to_python is Field.to_python:
+                    continue
+                decoder = get_decoder(field)
+            if decoder is not None:
+                decoders[key] = decoder
+
+        def convert_rows(rows):
+            if not rows:
+                return []
+            for key, decoder in decoders.items():
+                values = decoder([row[key] for row in rows])
+                for row, value in zip(rows, values):
+                    row[key] = value
+            return rows
+
+        return convert_rows
+
+
+class JSONAggSubquery(Subquery):
+    """Correlated subquery computing a JSON aggregate over all rows of a queryset.
+
+    This allows nesting JSON aggregates (e.g., comments per post, in a JSONRowAgg of
+    posts per author) and building a whole tree of related objects in one query.
+
+    Args:
+        queryset: rows to aggregate, usually filtered with OuterRef.
+        aggregate: JSON aggregate, e.g., JSONRowAgg.
+    """
+
+    output_field = JSONField()
+    result_name = "json_agg"
+
+    def __init__(self, queryset: QuerySet, aggregate: JSONAggregateMixin):
+        group_name = f"_{self.result_name}_group"
+        # grouping by a constant (which isn't part of GROUP BY) aggregates all rows
+        queryset = (
+            queryset.order_by()
+            .annotate(**{group_name: Value(1)})
+            .values(group_name)
+            .annotate(**{self.result_name: aggregate})
+            .values(self.result_name)
+        )
+        super().__init__(queryset)
+
+    @property
+    def aggregate(self) -> JSONAggregateMixin:
+        """The JSON aggregate, resolved in the subquery."""
+        return self.query.annotations[self.result_name]
+
+    def get_db_converters(self, connection: Any) -> list[callable[..., Any]]:
+        """Override Django's BaseExpression method to convert aggregated values."""
+        converters = super().get_db_converters(connection)
+        convert = self.aggregate._decoded_converter()
+        if convert is None:
+            return converters
+        return [
+            *converters,
+            partial(self.aggregate._decoded_to_python, convert=convert),
+        ]
+
+
+class JSONAggHash(Func):
+    """MD5 digest of a JSON aggregate, computed by the database.
+
+    The digest changes whenever the aggregated JSON text does, which makes it
+    suitable as an ETag: with the aggregate in ``alias`` rather than ``annotate``,
+    only the digest is transferred. On PostgreSQL the digest is computed from
+    jsonb text, which is canonical (e.g., object keys are sorted). Array elements
+    are hashed in the order rows are aggregated. Without any aggregated row, the
+    digest is null on PostgreSQL.
+
+    Args:
+        expression: JSON aggregate, or name of a JSON aggregate annotation.
+    """
+
+    function = "MD5"
+    output_field = CharField()
+
+    def __init__(self, expression: Any, **extra):
+        super().__init__(Cast(expression, output_field=TextField()), **extra)
+
+
+def _batch(convert):
+    if convert is None:
+        return None
+
+    def decode(values):
+        return [convert(v) for v in values]
+
+    return decode
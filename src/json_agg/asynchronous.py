@@ -0,0 +1,69 @@
+"""Evaluate JSON aggregates from async code without decoding on the db thread."""
+
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+from itertools import islice
+from typing import Any
+from typing import AsyncIterator
+
+from asgiref.sync import sync_to_async
+from django.db.models import QuerySet
+
+from ._payloads import get_payloads
+from ._payloads import raw_payload_queryset
+from ._payloads import set_decoded
+
+
+DEFAULT_CHUNK_SIZE = 100
+
+
+async def aiter_decoded(
+    queryset: QuerySet,
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    executor: Executor | None = None,
+) -> AsyncIterator[Any]:
+    """Asynchronously iterate over a queryset annotated with JSON aggregates.
+
+    Rows are fetched in chunks of ``chunk_size`` through ``sync_to_async`` (like
+    ``async for`` over a queryset does), but JSON aggregates are fetched as raw
+    JSON text and decoded on ``executor`` instead. This way the thread sensitive
+    database thread is released between chunks, available to other queries while
+    a chunk is decoded. Aggregates whose ``nested_output_field`` defines
+    ``from_db_value`` need the database connection and are converted by django.
+
+    Args:
+        queryset: queryset annotated with JSON aggregates.
+        chunk_size: number of rows fetched (and decoded) at once.
+        executor: executor used for decoding. Defaults to the event loop default
+            executor. A ProcessPoolExecutor can be used to also avoid the GIL.
+
+    Yields:
+        The queryset rows (model instances or ``values()`` dicts).
+
+    Raises:
+        ValueError: if rows aren't model instances or ``values()`` dicts.
+    """
+    queryset, decoders = raw_payload_queryset(queryset)
+    loop = asyncio.get_running_loop()
+    rows_iterator = queryset.iterator(chunk_size=chunk_size)
+
+    def _next_chunk():
+        return list(islice(rows_iterator, chunk_size))
+
+    try:
+        while rows := await sync_to_async(_next_chunk)():
+            payloads = get_payloads(rows, decoders)
+            decoded = await asyncio.gather(
+                *(
+                    loop.run_in_executor(executor, decoders[name].decode_many, values)
+                    for name, values in payloads.items()
+                )
+            )
+            set_decoded(rows, dict(zip(payloads, decoded)))
+            for row in rows:
+                yield row
+    finally:
+        await sync_to_async(rows_iterator.close)()
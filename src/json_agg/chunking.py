@@ -0,0 +1,242 @@
+"""Split JSON aggregates of huge groups into rows of bounded size."""
+
+from __future__ import annotations
+
+from itertools import groupby
+from operator import itemgetter
+from typing import Any
+from typing import Iterator
+
+from django.core.exceptions import EmptyResultSet
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Expression
+from django.db.models import F
+from django.db.models import JSONField
+from django.db.models import QuerySet
+from django.db.models import Window
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.functions import RowNumber
+from django.db.models.sql.constants import GET_ITERATOR_CHUNK_SIZE
+
+from .aggregates import JSONAggregateMixin
+from .aggregates import JSONObjectAgg
+from .aggregates import JSONRowAgg
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+_GROUP = "_json_agg_group"
+_ROW = "_json_agg_row"
+
+
+def iter_json_agg_chunks(
+    queryset: QuerySet,
+    aggregate: JSONAggregateMixin,
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    order_by: Any = None,
+) -> Iterator[tuple[Any, int, Any]]:
+    """Stream a JSON aggregate of queryset instances as chunks of bounded size.
+
+    Aggregated rows are numbered per instance (following ``order_by``) by the
+    database, which aggregates them per instance and chunk of ``chunk_size`` rows.
+    Chunks are fetched with a server side cursor when supported, so memory is
+    bounded by the chunk size rather than by the largest group. Instances without
+    aggregated rows are skipped when the aggregate filters rows (e.g., with
+    ``filter``, ``JSONObjectAgg`` or ``JSONRowAgg``).
+
+    Within a chunk, the aggregate orders rows on PostgreSQL and SQLite 3.44+.
+    Older SQLite versions don't support ordered aggregates: rows are aggregated in
+    the order of the rows subquery, as SQLite does in practice without
+    guaranteeing it.
+
+    Args:
+        queryset: queryset of model instances.
+        aggregate: JSON aggregate, as it would be passed to annotate.
+        chunk_size: maximum number of aggregated rows per chunk.
+        order_by: ordering of aggregated rows within each instance, as it would be
+            passed to Window. Defaults to the primary key of the related model.
+
+    Yields:
+        Tuples of instance primary key, chunk index (starting at 0) and chunk
+        value, ordered by primary key then chunk index.
+
+    Raises:
+        ValueError: if ``chunk_size`` isn't positive, or if ``order_by`` isn't
+            provided and the aggregate doesn't follow a multi-valued relation.
+        TypeError: if ``aggregate`` isn't a JSON aggregate.
+    """
+    if chunk_size < 1:
+        raise ValueError("'chunk_size' must be a positive integer.")
+    if not isinstance(aggregate, JSONAggregateMixin):
+        raise TypeError("'aggregate' must be a JSON aggregate.")
+    model = queryset.model
+    connection = connections[queryset.db]
+    if order_by is None:
+        order_by = _default_order_by(model, aggregate)
+
+    rows = model._default_manager.using(queryset.db).filter(
+        pk__in=queryset.values("pk")
+    )
+    if (rows_filter := aggregate._rows_filter(model)) is not None:
+        rows = rows.filter(rows_filter)
+    names = [f"_json_agg_{i}" for i in range(len(aggregate.source_expressions))]
+    rows = (
+        rows.annotate(
+            **{_GROUP: F("pk")},
+            **dict(zip(names, aggregate.source_expressions)),
+            **{_ROW: Window(RowNumber(), partition_by=[F("pk")], order_by=order_by)},
+        )
+        .order_by(_GROUP, _ROW)
+        .values(_GROUP, _ROW, *names)
+    )
+    resolved = [rows.query.annotations[name] for name in names]
+    if isinstance(aggregate, JSONRowAgg) and connection.vendor == "sqlite":
+        (name,) = names
+        rows.query.annotations[name] = JSONRowAgg._sqlite_json_object(resolved[0])
+
+    compiler = rows.query.get_compiler(connection=connection)
+    try:
+        rows_sql, rows_params = compiler.as_sql()
+    except EmptyResultSet:
+        return
+    # the aggregate over the rows subquery, converted as the original one
+    sql_aggregate = _with_sources(
+        aggregate,
+        (
+            _RowsColumn(name, expression._output_field_or_none)
+            for name, expression in zip(names, resolved)
+        ),
+    )
+    converted = _with_sources(aggregate, resolved)
+    aggregate_sql, aggregate_params = sql_aggregate.as_sql(
+        compiler, connection, **_ordered_aggregate_context(connection)
+    )
+    converters = [
+        *connection.ops.get_db_converters(converted),
+        *converted.get_db_converters(connection),
+    ]
+
+    qn = connection.ops.quote_name
+    select = f"{qn(_GROUP)}, ({qn(_ROW)} - 1) / {int(chunk_size)}, {aggregate_sql}"
+    subquery = f"({rows_sql}) {qn('json_agg_rows')}"
+    # values are parameters of the compiled SQL, only the chunk size is inlined
+    sql = f"SELECT {select} FROM {subquery} GROUP BY 1, 2 ORDER BY 1, 2"  # noqa: S608
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, (*aggregate_params, *rows_params))
+        while chunk_rows := cursor.fetchmany(GET_ITERATOR_CHUNK_SIZE):
+            for group, index, value in chunk_rows:
+                for converter in converters:
+                    value = converter(value, converted, connection)
+                yield group, index, value
+
+
+def iter_json_agg_groups(
+    queryset: QuerySet,
+    aggregate: JSONAggregateMixin,
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    order_by: Any = None,
+) -> Iterator[tuple[Any, Any]]:
+    """Stream a JSON aggregate of queryset instances, one instance at a time.
+
+    Same as ``iter_json_agg_chunks``, chunks being reassembled per instance: lists
+    are concatenated and dicts merged. Memory is bounded by the largest group
+    (rather than by the whole result), and the database never builds a JSON value
+    larger than ``chunk_size`` rows.
+
+    Args:
+        queryset: queryset of model instances.
+        aggregate: JSON aggregate, as it would be passed to annotate.
+        chunk_size: maximum number of aggregated rows per chunk.
+        order_by: ordering of aggregated rows within each instance, as it would be
+            passed to Window. Defaults to the primary key of the related model.
+
+    Yields:
+        Tuples of instance primary key and aggregate value, ordered by primary key.
+    """
+    is_object = isinstance(aggregate, JSONObjectAgg)
+    chunks = iter_json_agg_chunks(
+        queryset, aggregate, chunk_size=chunk_size, order_by=order_by
+    )
+    for group, group_chunks in groupby(chunks, key=itemgetter(0)):
+        if is_object:
+            value = {}
+            for _, _, chunk in group_chunks:
+                value.update(chunk)
+        else:
+            value = [element for _, _, chunk in group_chunks for element in chunk]
+        yield group, value
+
+
+class _RowsColumn(Expression):
+    """Column of the aggregated rows subquery."""
+
+    def __init__(self, name, output_field):
+        super().__init__(output_field=output_field)
+        self.name = name
+
+    def as_sql(self, compiler, connection):
+        return connection.ops.quote_name(self.name), []
+
+    def as_sqlite(self, compiler, connection):
+        sql, params = self.as_sql(compiler, connection)
+        # JSON values lose their JSON subtype through subqueries
+        if isinstance(self.output_field, JSONField):
+            sql = f"JSON({sql})"
+        return sql, params
+
+
+def _with_sources(aggregate, expressions):
+    clone = aggregate.copy()
+    # rows are already filtered
+    clone.filter = None
+    clone.set_source_expressions(list(expressions))
+    if isinstance(clone, JSONObjectAgg):
+        clone.push_key_filter = False
+    return clone
+
+
+def _ordered_aggregate_context(connection):
+    if not _supports_aggregate_order_by(connection):
+        return {}
+    row = connection.ops.quote_name(_ROW)
+    return {"template": f"%(function)s(%(expressions)s ORDER BY {row})"}
+
+
+def _supports_aggregate_order_by(connection):
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 44)
+    return connection.vendor == "postgresql"
+
+
+def _default_order_by(model, aggregate):
+    for source in aggregate.source_expressions:
+        expressions = source.flatten() if hasattr(source, "flatten") else [source]
+        for expression in expressions:
+            if type(expression) is not F:
+                continue
+            relation = _relation_path(model, expression.name)
+            if relation:
+                return f"{relation}{LOOKUP_SEP}pk"
+    raise ValueError(
+        "'order_by' is required for aggregates not following a multi-valued relation."
+    )
+
+
+def _relation_path(model, path):
+    names = path.split(LOOKUP_SEP)
+    relation = []
+    opts = model._meta
+    for i, name in enumerate(names):
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            break
+        if not field.is_relation:
+            break
+        if field.one_to_many or field.many_to_many:
+            relation = names[: i + 1]
+        opts = field.related_model._meta
+    return LOOKUP_SEP.join(relation)
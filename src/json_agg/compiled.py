@@ -0,0 +1,148 @@
+"""Compile aggregate querysets once and execute them with new parameters."""
+
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Expression
+from django.db.models import Field
+from django.db.models import QuerySet
+from django.db.models import prefetch_related_objects
+
+
+class Param(Expression):
+    """Placeholder for a value bound when executing a CompiledQuery.
+
+    Args:
+        name: name of the keyword argument of ``CompiledQuery.execute`` holding
+            the value.
+        output_field: Django's model Field used to prepare the value for the
+            database. If not provided, values are passed to the database as is.
+    """
+
+    def __init__(self, name: str, output_field: Field | None = None):
+        super().__init__(output_field=output_field)
+        self.name = name
+
+    def __repr__(self):
+        """Represent the parameter by its name."""
+        return f"{self.__class__.__name__}({self.name!r})"
+
+    def as_sql(self, compiler, connection):
+        """Compile to a placeholder, the parameter being the Param itself."""
+        return "%s", [self]
+
+    def bind(self, values: dict[str, Any], connection: Any) -> Any:
+        """Get the database value of this parameter in ``values``."""
+        try:
+            value = values[self.name]
+        except KeyError:
+            raise ValueError(f"Missing value for parameter '{self.name}'.") from None
+        if self._output_field_or_none is None:
+            return value
+        return self.output_field.get_db_prep_value(value, connection)
+
+
+class CompiledQuery:
+    """Queryset compiled once per database connection.
+
+    Annotations are resolved and the SQL generated the first time the query is
+    executed on a connection. Later executions only bind ``Param`` values to the
+    cached SQL. On PostgreSQL with psycopg 3 and ``server_side_binding``, the
+    statement is also prepared by the server on its first execution.
+
+    Args:
+        queryset: queryset to compile, using ``Param`` where values change between
+            executions (e.g., ``filter(name=Param("name"))``).
+    """
+
+    def __init__(self, queryset: QuerySet):
+        self.queryset = queryset
+        # compilers are bound to connections, which are per thread
+        self._local = threading.local()
+
+    def execute(self, *, using: str | None = None, **values: Any) -> list[Any]:
+        """Execute the query with the given parameter values.
+
+        Args:
+            using: database alias. Defaults to the queryset database.
+            **values: values of the ``Param`` placeholders, by name.
+
+        Returns:
+            The evaluated rows, as the queryset would return them.
+
+        Raises:
+            ValueError: if a parameter value is missing.
+        """
+        compiled = self._get_compiled(using or self.queryset.db)
+        compiled.bind(values)
+        queryset = compiled.queryset
+        if compiled.prepare:
+            with compiled.connection.execute_wrapper(compiled.prepare_wrapper):
+                rows = list(queryset._iterable_class(queryset))
+        else:
+            rows = list(queryset._iterable_class(queryset))
+        if queryset._prefetch_related_lookups:
+            prefetch_related_objects(rows, *queryset._prefetch_related_lookups)
+        return rows
+
+    def _get_compiled(self, alias):
+        cache = self._local.__dict__.setdefault("compiled", {})
+        compiled = cache.get(alias)
+        connection = connections[alias]
+        if compiled is None or compiled.connection is not connection:
+            compiled = cache[alias] = _Compiled(self.queryset.using(alias), connection)
+        return compiled
+
+
+class _Compiled:
+    def __init__(self, queryset, connection):
+        self.connection = connection
+        self.compiler = compiler = queryset.query.get_compiler(connection=connection)
+        try:
+            self.sql, self.params = compiler.as_sql()
+        except EmptyResultSet:
+            self.sql, self.params = "", ()
+        self.bound_params = self.params
+        # evaluating the queryset calls get_compiler then as_sql: return the cached
+        # ones instead of compiling again
+        compiler.as_sql = self.as_sql
+        queryset = queryset._chain()
+        queryset.query.get_compiler = self.get_compiler
+        self.queryset = queryset
+        self.prepare = _can_prepare(connection)
+
+    def get_compiler(self, using=None, connection=None, elide_empty=True):
+        return self.compiler
+
+    def as_sql(self, with_limits=True, with_col_aliases=False):
+        if not self.sql:
+            raise EmptyResultSet
+        return self.sql, self.bound_params
+
+    def bind(self, values):
+        self.bound_params = tuple(
+            p.bind(values, self.connection) if isinstance(p, Param) else p
+            for p in self.params
+        )
+
+    def prepare_wrapper(self, execute, sql, params, many, context):
+        if sql is not self.sql or many:
+            return execute(sql, params, many, context)
+        with self.connection.wrap_database_errors:
+            return context["cursor"].cursor.execute(sql, params, prepare=True)
+
+
+def _can_prepare(connection):
+    options = connection.settings_dict["OPTIONS"]
+    if (
+        connection.vendor != "postgresql"
+        or options.get("server_side_binding") is not True
+    ):
+        return False
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+    return is_psycopg3
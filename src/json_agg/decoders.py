@@ -0,0 +1,154 @@
+"""Registry of fast decoders for values nested in JSON aggregates."""
+
+from __future__ import annotations
+
+import datetime
+import decimal
+import uuid
+from typing import Any
+from typing import Callable
+from typing import List
+
+from django.db.models import BooleanField
+from django.db.models import DateField
+from django.db.models import DateTimeField
+from django.db.models import DecimalField
+from django.db.models import Field
+from django.db.models import FloatField
+from django.db.models import IntegerField
+from django.db.models import UUIDField
+
+
+# converts a list of values decoded from JSON, returning a new list
+BatchDecoder = Callable[[List[Any]], List[Any]]
+# builds the batch decoder of a given field
+DecoderFactory = Callable[[Field], BatchDecoder]
+
+_registry: dict[type[Field], DecoderFactory] = {}
+
+
+def register_decoder(field_class: type[Field], factory: DecoderFactory):
+    """Register a decoder factory for ``nested_output_field`` of ``field_class``.
+
+    The factory receives the field and returns a function converting a list of
+    values decoded from JSON, which must return the same values as
+    ``field.to_python`` would for each of them. Decoders are also used for
+    subclasses of ``field_class``, unless they override ``to_python``.
+
+    Args:
+        field_class: Django model Field class.
+        factory: callable building the decoder of a field.
+
+    Raises:
+        TypeError: if ``field_class`` isn't a Django model Field class.
+    """
+    if not (isinstance(field_class, type) and issubclass(field_class, Field)):
+        raise TypeError("'field_class' must be a Django model Field class.")
+    _registry[field_class] = factory
+
+
+def get_decoder(field: Field) -> BatchDecoder:
+    """Get the batch decoder of ``field``.
+
+    Falls back to calling ``field.to_python`` on each value when no decoder is
+    registered for the field class.
+
+    Args:
+        field: Django model Field.
+
+    Returns:
+        A function converting a list of values decoded from JSON.
+    """
+    for field_class in type(field).__mro__:
+        factory = _registry.get(field_class)
+        if factory is not None:
+            # a decoder doesn't know about to_python overrides
+            if type(field).to_python is field_class.to_python:
+                return factory(field)
+            break
+    return _to_python_decoder(field)
+
+
+def _to_python_decoder(field):
+    to_python = field.to_python
+
+    def decode(values):
+        return [to_python(v) for v in values]
+
+    return decode
+
+
+def _with_fallback(field, convert):
+    # convert is only expected to handle the common case, any error (or invalid
+    # value) is handled by to_python, for the whole batch.
+    to_python = field.to_python
+
+    def decode(values):
+        try:
+            return [None if v is None else convert(v) for v in values]
+        except (TypeError, ValueError, ArithmeticError):
+            return [to_python(v) for v in values]
+
+    return decode
+
+
+def _int_decoder(field):
+    return _with_fallback(field, int)
+
+
+def _float_decoder(field):
+    return _with_fallback(field, float)
+
+
+def _bool_decoder(field):
+    to_python = field.to_python
+    # 1 and 0 are equal to True and False
+    values_map = {True: True, False: False}
+    if field.null:
+        values_map[None] = None
+
+    def decode(values):
+        try:
+            return [values_map[v] for v in values]
+        except (KeyError, TypeError):
+            return [to_python(v) for v in values]
+
+    return decode
+
+
+def _decimal_decoder(field):
+    from_float = field.context.create_decimal_from_float
+
+    def convert(value):
+        result = from_float(value) if type(value) is float else decimal.Decimal(value)
+        if not result.is_finite():
+            raise ValueError
+        return result
+
+    return _with_fallback(field, convert)
+
+
+def _uuid_decoder(field):
+    def convert(value):
+        if type(value) is not str:
+            raise TypeError
+        return uuid.UUID(value)
+
+    return _with_fallback(field, convert)
+
+
+def _date_decoder(field):
+    return _with_fallback(field, datetime.date.fromisoformat)
+
+
+def _datetime_decoder(field):
+    return _with_fallback(field, datetime.datetime.fromisoformat)
+
+
+register_decoder(IntegerField, _int_decoder)
+register_decoder(FloatField, _float_decoder)
+register_decoder(BooleanField, _bool_decoder)
+register_decoder(DecimalField, _decimal_decoder)
+register_decoder(UUIDField, _uuid_decoder)
+register_decoder(DateField, _date_decoder)
+register_decoder(DateTimeField, _datetime_decoder)
@@ -0,0 +1,243 @@
+"""Query plan diagnostics for querysets annotated with JSON aggregates."""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import replace
+from typing import Any
+
+from django.db import connections
+from django.db.models import Model
+from django.db.models import QuerySet
+from django.db.models.expressions import Col
+from django.db.models.sql.datastructures import Join
+
+from ._joins import walk
+from .aggregates import JSONAggregateMixin
+
+
+FULL_SCAN = "full_scan"
+TEMP_SORT = "temp_sort"
+
+# SQLite < 3.36 plans read "SCAN TABLE name"
+_SQLITE_SCAN = re.compile(r"\bSCAN (?:TABLE )?(?P<name>\S+)(?!.*\bINDEX\b)")
+_SQLITE_AUTOMATIC_INDEX = re.compile(
+    r"\bSEARCH (?:TABLE )?(?P<name>\S+) USING AUTOMATIC\b"
+)
+_SQLITE_TEMP_BTREE = re.compile(r"\bUSE TEMP B-TREE FOR (?P<name>.+)$")
+_POSTGRES_SEQ_SCAN = re.compile(r"\bSeq Scan on (?P<name>\S+)(?: (?P<alias>\w+))?")
+_POSTGRES_SORT_KEY = re.compile(r"\bSort Key: (?:(?P<name>\w+)\.)?")
+
+
+@dataclass(frozen=True)
+class PlanIssue:
+    """Potential performance issue found in a query plan.
+
+    Args:
+        kind: either FULL_SCAN or TEMP_SORT.
+        table: table (or alias) the issue refers to, if known.
+        detail: query plan line describing the issue.
+    """
+
+    kind: str
+    table: str | None
+    detail: str
+
+
+@dataclass(frozen=True)
+class IndexSuggestion:
+    """Index that would support JSON aggregates over ``model``.
+
+    Args:
+        model: model the index should be added to.
+        fields: names of the fields, in order, the index should cover.
+    """
+
+    model: type[Model]
+    fields: tuple[str, ...]
+
+    def __str__(self):
+        """Format the suggestion as a django model Index."""
+        return f"{self.model._meta.label}: models.Index(fields={list(self.fields)!r})"
+
+
+@dataclass
+class ExplainReport:
+    """Result of ``explain``.
+
+    Args:
+        plan: the query plan, as returned by QuerySet.explain.
+        issues: potential issues found in the plan.
+        suggestions: indexes that would support the aggregates.
+    """
+
+    plan: str
+    issues: list[PlanIssue] = field(default_factory=list)
+    suggestions: list[IndexSuggestion] = field(default_factory=list)
+
+    def __str__(self):
+        """Format the report for humans."""
+        lines = [self.plan]
+        lines.extend(f"{i.kind} on {i.table or '?'}: {i.detail}" for i in self.issues)
+        lines.extend(f"suggested index: {s}" for s in self.suggestions)
+        return "\n".join(lines)
+
+
+def explain(queryset: QuerySet) -> ExplainReport:
+    """Explain a queryset annotated with JSON aggregates.
+
+    The query plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on PostgreSQL) is checked
+    for full scans and sorts (temp B-trees on SQLite) on the tables JSON aggregates
+    are computed from. SQLite plans don't name the table of temp B-trees, which is
+    deduced from the ordering (or grouping) of the query. Indexes supporting the
+    join, filter and ordering of those tables are suggested, unless an existing
+    index already starts with the same columns.
+
+    Args:
+        queryset: queryset annotated with JSON aggregates.
+
+    Returns:
+        A report with the plan, issues found and index suggestions.
+
+    Raises:
+        ValueError: if the database vendor isn't supported.
+    """
+    connection = connections[queryset.db]
+    parsers = {"sqlite": _sqlite_issues, "postgresql": _postgresql_issues}
+    if connection.vendor not in parsers:
+        raise ValueError(f"explain is not supported on '{connection.vendor}'.")
+    query = queryset.query
+    plan = queryset.explain()
+
+    ordering = _ordering(query, connection)
+    columns_per_alias = _aggregated_columns(query, ordering)
+    names = {alias.lower() for alias in columns_per_alias}
+    names.update(
+        query.alias_map[alias].table_name.lower() for alias in columns_per_alias
+    )
+    sort_aliases = _sort_aliases(query, ordering)
+    issues = []
+    for issue in parsers[connection.vendor](plan):
+        if issue.kind == TEMP_SORT and issue.table is None:
+            issue = replace(issue, table=_sort_table(issue, sort_aliases, names))
+        # sorts on unknown tables are kept, they may be on aggregated ones
+        if (issue.table or "").lower() in names or (
+            issue.kind == TEMP_SORT and issue.table is None
+        ):
+            issues.append(issue)
+
+    suggestions = []
+    with connection.cursor() as cursor:
+        for alias, (model, columns) in columns_per_alias.items():
+            if not columns:
+                continue
+            table = query.alias_map[alias].table_name
+            constraints = connection.introspection.get_constraints(cursor, table)
+            indexed = [
+                tuple(c["columns"])
+                for c in constraints.values()
+                if c["index"] or c["primary_key"] or c["unique"]
+            ]
+            if any(index[: len(columns)] == columns for index in indexed):
+                continue
+            field_per_column = {f.column: f.name for f in model._meta.concrete_fields}
+            suggestions.append(
+                IndexSuggestion(model, tuple(field_per_column[c] for c in columns))
+            )
+    return ExplainReport(plan=plan, issues=issues, suggestions=suggestions)
+
+
+def _aggregated_columns(
+    query, ordering: list[Any]
+) -> dict[str, tuple[type[Model], tuple[str, ...]]]:
+    """Map aliases used by JSON aggregates to their model and supporting columns.
+
+    Supporting columns are the join columns (or group by columns for the base
+    table) followed by columns used in aggregate filters and in ordering. Primary
+    keys (e.g., the not null filter of JSONRowAgg) aren't worth indexing again.
+    """
+    aggregates = [
+        annotation
+        for annotation in query.annotation_select.values()
+        if isinstance(annotation, JSONAggregateMixin)
+    ]
+    columns_per_alias = {}
+    for aggregate in aggregates:
+        for col in _cols(aggregate.get_source_expressions()):
+            model = col.target.model
+            alias = col.alias
+            if alias in columns_per_alias:
+                continue
+            join = query.alias_map[alias]
+            if isinstance(join, Join):
+                lead = [child for _, child in join.join_cols]
+            elif isinstance(query.group_by, tuple):
+                lead = [c.target.column for c in _cols(query.group_by, alias)]
+            else:
+                lead = []
+            columns_per_alias[alias] = (model, lead)
+        for col in _cols([aggregate.filter]):
+            if col.alias in columns_per_alias and not col.target.primary_key:
+                columns_per_alias[col.alias][1].append(col.target.column)
+    for col in _cols(ordering):
+        if col.alias in columns_per_alias and not col.target.primary_key:
+            columns_per_alias[col.alias][1].append(col.target.column)
+    return {
+        alias: (model, tuple(dict.fromkeys(columns)))
+        for alias, (model, columns) in columns_per_alias.items()
+    }
+
+
+def _ordering(query, connection) -> list[Any]:
+    """Get the ordering expressions of the query, resolved as when compiled."""
+    compiler = query.get_compiler(connection=connection)
+    compiler.setup_query()
+    return [expression for expression, _ in compiler.get_order_by()]
+
+
+def _sort_aliases(query, ordering: list[Any]) -> dict[str, list[str]]:
+    """Map SQLite temp B-tree purposes to the aliases of the sorted columns."""
+    return {
+        "ORDER BY": list(dict.fromkeys(col.alias for col in _cols(ordering))),
+        "GROUP BY": [query.base_table] if query.base_table else [],
+    }
+
+
+def _sort_table(issue, sort_aliases, names):
+    for purpose, aliases in sort_aliases.items():
+        if purpose in issue.detail and aliases:
+            return next((a for a in aliases if a.lower() in names), aliases[0])
+    return None
+
+
+def _cols(expressions: Any, alias: str | None = None) -> list[Col]:
+    return [
+        node
+        for expression in expressions
+        if expression is not None
+        for node in walk(expression)
+        if isinstance(node, Col) and (alias is None or node.alias == alias)
+    ]
+
+
+def _sqlite_issues(plan: str) -> list[PlanIssue]:
+    issues = []
+    for line in plan.splitlines():
+        if match := _SQLITE_SCAN.search(line) or _SQLITE_AUTOMATIC_INDEX.search(line):
+            issues.append(PlanIssue(FULL_SCAN, match["name"], line.strip()))
+        elif match := _SQLITE_TEMP_BTREE.search(line):
+            issues.append(PlanIssue(TEMP_SORT, None, line.strip()))
+    return issues
+
+
+def _postgresql_issues(plan: str) -> list[PlanIssue]:
+    issues = []
+    for line in plan.splitlines():
+        if match := _POSTGRES_SEQ_SCAN.search(line):
+            table = match["alias"] or match["name"]
+            issues.append(PlanIssue(FULL_SCAN, table, line.strip()))
+        elif match := _POSTGRES_SORT_KEY.search(line):
+            issues.append(PlanIssue(TEMP_SORT, match["name"], line.strip()))
+    return issues
@@ -0,0 +1,123 @@
+"""Evaluate JSON aggregates across several databases sharing the same schema."""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from typing import Sequence
+
+from django.db import connections
+from django.db.models import QuerySet
+
+from ._rows import check_rows
+from ._rows import get_value
+from ._rows import set_value
+from .aggregates import JSONAggSubquery
+from .aggregates import JSONArrayAgg
+from .aggregates import JSONObjectAgg
+
+
+ON_CONFLICT_CHOICES = ("raise", "first", "last")
+
+
+def fan_out(
+    queryset: QuerySet,
+    using: Sequence[str],
+    *,
+    key: str = "pk",
+    on_conflict: str = "raise",
+    max_workers: int | None = None,
+) -> list[Any]:
+    """Evaluate an aggregate queryset against several databases and merge results.
+
+    The queryset is evaluated concurrently in a thread pool, one thread (and thus
+    one connection) per database alias. Rows sharing the same ``key`` are merged
+    into a single row: ``JSONObjectAgg`` annotations are merged as dicts and
+    ``JSONArrayAgg`` annotations are concatenated, following the order of
+    ``using``, the same way for ``JSONAggSubquery`` annotations of such aggregates.
+    Null aggregates (databases without rows) are ignored. Other attributes are
+    taken from the first row found.
+
+    Args:
+        queryset: queryset annotated with JSON aggregates. Both model instances and
+            ``values()`` querysets are supported.
+        using: database aliases the queryset will be evaluated against.
+        key: attribute (or ``values()`` key) identifying rows across databases.
+        on_conflict: policy for JSON object keys found in more than one database
+            with different values. "raise" raises ValueError, "first" keeps the
+            value from the first alias in ``using`` and "last" keeps the value from
+            the last one.
+        max_workers: maximum number of threads. Defaults to one per alias.
+
+    Returns:
+        Merged rows, in the order they were first seen following ``using``.
+
+    Raises:
+        ValueError: if ``on_conflict`` is invalid, if rows aren't model instances
+            or ``values()`` dicts, or if a conflict is found with the "raise" policy.
+    """
+    if on_conflict not in ON_CONFLICT_CHOICES:
+        raise ValueError(
+            f"Invalid on_conflict ('{on_conflict}'). "
+            f"Valid values are {list(ON_CONFLICT_CHOICES)}."
+        )
+    check_rows(queryset)
+    aggregates = {}
+    for name, annotation in queryset.query.annotation_select.items():
+        if isinstance(annotation, JSONAggSubquery):
+            annotation = annotation.aggregate
+        if isinstance(annotation, (JSONObjectAgg, JSONArrayAgg)):
+            aggregates[name] = annotation
+    with ThreadPoolExecutor(max_workers=max_workers or len(using) or 1) as executor:
+        results = list(executor.map(_evaluator(queryset), using))
+
+    merged_rows = {}
+    for rows in results:
+        for row in rows:
+            group = get_value(row, key)
+            if group not in merged_rows:
+                merged_rows[group] = row
+                continue
+            merged = merged_rows[group]
+            for name, aggregate in aggregates.items():
+                value = _merge(
+                    aggregate,
+                    get_value(merged, name),
+                    get_value(row, name),
+                    on_conflict=on_conflict,
+                    group=group,
+                )
+                set_value(merged, name, value)
+    return list(merged_rows.values())
+
+
+def _evaluator(queryset):
+    def _evaluate(alias):
+        try:
+            return list(queryset.using(alias))
+        finally:
+            # connections are thread local; don't leak the one opened by this worker
+            connections[alias].close()
+
+    return _evaluate
+
+
+def _merge(aggregate, merged, value, *, on_conflict, group):
+    # aggregates without rows can be null (e.g., filtered JSONB_AGG)
+    if value is None:
+        return merged
+    if merged is None:
+        return value
+    if isinstance(aggregate, JSONArrayAgg):
+        return [*merged, *value]
+    merged = dict(merged)
+    for json_key, json_value in value.items():
+        if json_key in merged and merged[json_key] != json_value:
+            if on_conflict == "raise":
+                raise ValueError(
+                    f"Conflicting values for key '{json_key}' on group '{group}'."
+                )
+            if on_conflict == "first":
+                continue
+        merged[json_key] = json_value
+    return merged
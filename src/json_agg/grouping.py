@@ -0,0 +1,241 @@
+"""Python side grouping engine for JSON aggregates."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Iterable
+
+from django.db import connections
+from django.db.models import F
+from django.db.models import Func
+from django.db.models import JSONField
+from django.db.models import Model
+from django.db.models import QuerySet
+from django.db.models import TextField
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.functions import Cast
+from django.db.models.query import ModelIterable
+
+from .aggregates import JSONAggregateMixin
+from .aggregates import JSONObjectAgg
+
+
+# functions encoding a single value as JSON, per database vendor
+_JSON_FUNCTIONS = {"sqlite": "JSON_QUOTE", "postgresql": "TO_JSONB"}
+
+AUTO = "auto"
+DATABASE = "database"
+PYTHON = "python"
+STRATEGIES = (AUTO, DATABASE, PYTHON)
+
+# average number of related rows per instance from which the "auto" strategy
+# prefers grouping python side.
+DEFAULT_GROUP_SIZE_THRESHOLD = 1000
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def annotate_json(
+    queryset: QuerySet,
+    *,
+    strategy: str = AUTO,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    **aggregates: JSONAggregateMixin,
+) -> list[Model]:
+    """Evaluate a queryset with JSON aggregates computed by the chosen strategy.
+
+    With the "database" strategy this is the same as
+    ``list(queryset.annotate(**aggregates))``. With the "python" strategy, each
+    aggregate is computed with a single streamed ``values_list`` query over the
+    queryset instances and grouped python side, which is faster for a few huge
+    groups and works on databases without JSON aggregates. Values are encoded to
+    JSON by the database, row by row, so both strategies return the same values
+    (including for instances without rows). On databases without JSON functions,
+    JSON object keys are converted to strings unless ``key_output_field`` is used,
+    and values are the ones produced by model fields.
+
+    The "auto" strategy picks "python" if the database doesn't support the
+    aggregates or if the estimated group size is large, "database" otherwise.
+
+    Args:
+        queryset: queryset of model instances.
+        strategy: one of "auto", "database" or "python".
+        chunk_size: number of rows fetched at once by the python strategy.
+        **aggregates: JSON aggregates, as they would be passed to annotate.
+
+    Returns:
+        The evaluated instances, with aggregates set as attributes.
+
+    Raises:
+        ValueError: if the strategy is invalid, or the python strategy is used
+            with something else than model instances.
+        TypeError: if the python strategy is used with aggregates over something
+            else than field paths, or with ``strip_nulls``.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(
+            f"Invalid strategy ('{strategy}'). Valid values are {list(STRATEGIES)}."
+        )
+    if strategy == AUTO:
+        strategy = choose_strategy(queryset, aggregates.values())
+    if strategy == DATABASE:
+        return list(queryset.annotate(**aggregates))
+    if queryset._iterable_class is not ModelIterable:
+        raise ValueError("The python strategy only supports model instances.")
+
+    instances = list(queryset)
+    base_queryset = queryset.model._default_manager.using(queryset.db).filter(
+        pk__in=queryset.values("pk")
+    )
+    connection = connections[queryset.db]
+    for name, aggregate in aggregates.items():
+        grouped = _group(base_queryset, aggregate, chunk_size)
+        # same conversions as the ones of JSON decoded from the database
+        converters = aggregate._decoded_db_converters(connection)
+        for instance in instances:
+            if instance.pk in grouped:
+                value = grouped[instance.pk]
+            else:
+                # a new value per instance, so they don't share mutable values
+                value = _empty_value(aggregate, connection.vendor)
+            for converter in converters:
+                value = converter(value, aggregate, connection)
+            setattr(instance, name, value)
+    return instances
+
+
+def choose_strategy(
+    queryset: QuerySet,
+    aggregates: Iterable[JSONAggregateMixin],
+    *,
+    group_size_threshold: int = DEFAULT_GROUP_SIZE_THRESHOLD,
+) -> str:
+    """Choose between "database" and "python" strategies for ``aggregates``.
+
+    Group sizes are estimated from table statistics (``pg_class`` on PostgreSQL,
+    ``sqlite_stat1`` on SQLite, which requires ANALYZE). Without statistics, or if
+    an aggregate can't be computed python side, the "database" strategy is chosen
+    if supported.
+
+    Args:
+        queryset: queryset the aggregates would annotate.
+        aggregates: JSON aggregates.
+        group_size_threshold: estimated number of related rows per instance from
+            which the "python" strategy is chosen.
+
+    Returns:
+        Either "database" or "python".
+    """
+    aggregates = list(aggregates)
+    vendor = connections[queryset.db].vendor
+    if any(vendor not in aggregate.vendor_functions for aggregate in aggregates):
+        return PYTHON
+    parent_rows = estimate_rows(queryset.model, queryset.db)
+    if not parent_rows:
+        return DATABASE
+    for aggregate in aggregates:
+        try:
+            paths = _paths(aggregate)
+        except TypeError:
+            return DATABASE
+        model = _related_model(queryset.model, paths[-1])
+        if model is None:
+            continue
+        child_rows = estimate_rows(model, queryset.db)
+        if child_rows and child_rows / parent_rows >= group_size_threshold:
+            return PYTHON
+    return DATABASE
+
+
+def estimate_rows(model: type[Model], using: str) -> int | None:
+    """Estimate the number of rows of ``model`` table from database statistics.
+
+    Args:
+        model: the model.
+        using: database alias.
+
+    Returns:
+        The estimated number of rows, or None if unknown.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", [table]
+            )
+            row = cursor.fetchone()
+            # reltuples is -1 for tables never analyzed (0 before PostgreSQL 14)
+            return int(row[0]) if row and row[0] > 0 else None
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                "AND name = 'sqlite_stat1'"
+            )
+            if not cursor.fetchone():
+                return None
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+            # the first number of each stat is the number of rows in the table
+            rows = [int(stat.split()[0]) for (stat,) in cursor.fetchall()]
+            return max(rows, default=None)
+    return None
+
+
+def _group(base_queryset, aggregate, chunk_size):
+    _paths(aggregate)
+    json_function = _JSON_FUNCTIONS.get(connections[base_queryset.db].vendor)
+    queryset = base_queryset
+    if aggregate.filter is not None:
+        queryset = queryset.filter(aggregate.filter)
+    *keys, value = aggregate.source_expressions
+    if json_function is not None:
+        # keys are cast to text by JSON object aggregates
+        keys = [Cast(key, output_field=TextField()) for key in keys]
+        value = Func(value, function=json_function, output_field=JSONField())
+    rows = queryset.values_list("pk", *keys, value).iterator(chunk_size=chunk_size)
+    if isinstance(aggregate, JSONObjectAgg):
+        grouped = defaultdict(dict)
+        # keys are strings in JSON, unless converted by key_output_field
+        typed_keys = json_function is not None or aggregate.key_output_field
+        for pk, key, value in rows:
+            grouped[pk][key if typed_keys else str(key)] = value
+    else:
+        grouped = defaultdict(list)
+        for pk, value in rows:
+            grouped[pk].append(value)
+    return grouped
+
+
+def _empty_value(aggregate, vendor):
+    # the value of the aggregate, as fetched and decoded, without rows
+    if isinstance(aggregate, JSONObjectAgg):
+        return {}
+    # JSONB_AGG is null without rows, JSON_GROUP_ARRAY an empty array
+    return None if vendor == "postgresql" else []
+
+
+def _paths(aggregate):
+    if aggregate.strip_nulls:
+        raise TypeError("The python strategy doesn't support strip_nulls.")
+    vendor_funcs = {v for k, v in aggregate.extra.items() if k.endswith("_func")}
+    paths = []
+    for expression in aggregate.source_expressions:
+        # unwrap vendor_func, irrelevant for values coming from model fields
+        if (
+            isinstance(expression, Func)
+            and expression.extra.get("function") in vendor_funcs
+        ):
+            (expression,) = expression.get_source_expressions()
+        if not isinstance(expression, F):
+            raise TypeError("The python strategy only supports field paths.")
+        paths.append(expression.name)
+    return paths
+
+
+def _related_model(model, path):
+    related_model = None
+    for name in path.split(LOOKUP_SEP):
+        field = model._meta.get_field(name)
+        if not field.is_relation:
+            break
+        model = related_model = field.related_model
+    return related_model
@@ -0,0 +1,98 @@
+"""Decode JSON aggregate payloads in a process pool."""
+
+from __future__ import annotations
+
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import Any
+
+from django.db.models import QuerySet
+
+from ._payloads import get_payloads
+from ._payloads import raw_payload_queryset
+from ._payloads import set_decoded
+
+
+# decoding stays inline unless a threshold is given: pickling payloads to worker
+# processes isn't free, and benchmarks/bench_parallel_decode.py measured no
+# crossover where a pool wins by default (it depends on the number of cores and on
+# nested_output_field conversion), so run it to pick a threshold for a machine
+DEFAULT_THRESHOLD = None
+DEFAULT_CHUNK_SIZE = 200
+
+
+def parallel_decode(
+    queryset: QuerySet,
+    *,
+    threshold: int | None = DEFAULT_THRESHOLD,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    executor: Executor | None = None,
+    max_workers: int | None = None,
+) -> list[Any]:
+    """Evaluate a queryset decoding its JSON aggregates in a process pool.
+
+    JSON aggregates are fetched as raw JSON text and, when a ``threshold`` is given
+    and their combined size reaches it, decoded (including ``nested_output_field``
+    conversion) in chunks of ``chunk_size`` rows by worker processes. Decoded values
+    are then set on the evaluated rows. Aggregates whose ``nested_output_field``
+    defines ``from_db_value`` need the database connection and are always converted
+    inline.
+
+    Args:
+        queryset: queryset annotated with JSON aggregates.
+        threshold: minimum size, in characters, of the raw payloads for decoding
+            to happen in worker processes. Decoding stays inline if not provided,
+            see benchmarks/bench_parallel_decode.py to pick one.
+        chunk_size: number of rows decoded per task.
+        executor: executor used for decoding. If not provided, a
+            ProcessPoolExecutor is created (and shut down) for this call, which is
+            significantly slower than reusing a long lived executor.
+        max_workers: maximum number of processes when creating the executor.
+
+    Returns:
+        The evaluated rows (model instances or ``values()`` dicts).
+
+    Raises:
+        ValueError: if rows aren't model instances or ``values()`` dicts.
+    """
+    queryset, decoders = raw_payload_queryset(queryset)
+    rows = list(queryset)
+    payloads = get_payloads(rows, decoders)
+    size = sum(len(p) for values in payloads.values() for p in values if p)
+    if threshold is None or size < threshold:
+        decoded = {
+            name: decoders[name].decode_many(values)
+            for name, values in payloads.items()
+        }
+    else:
+        decoded = _decode_in_pool(
+            decoders,
+            payloads,
+            chunk_size=chunk_size,
+            executor=executor,
+            max_workers=max_workers,
+        )
+    set_decoded(rows, decoded)
+    return rows
+
+
+def _decode_in_pool(decoders, payloads, *, chunk_size, executor, max_workers):
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            name: [
+                executor.submit(decoders[name].decode_many, values[i : i + chunk_size])
+                for i in range(0, len(values), chunk_size)
+            ]
+            for name, values in payloads.items()
+        }
+        return {
+            name: list(chain.from_iterable(f.result() for f in name_futures))
+            for name, name_futures in futures.items()
+        }
+    finally:
+        if own_executor:
+            executor.shutdown()
@@ -0,0 +1,86 @@
+"""Compute JSON aggregates for already evaluated model instances."""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+from django.db import connections
+from django.db.models import Model
+
+from .aggregates import JSONAggregateMixin
+
+
+def prefetch_json_agg(
+    instances: Sequence[Model],
+    *,
+    using: str | None = None,
+    batch_size: int | None = None,
+    **aggregates: JSONAggregateMixin,
+):
+    """Compute JSON aggregates of model instances and set them as attributes.
+
+    Useful when instances can't be annotated anymore (e.g., after pagination or
+    when loaded from a cache). Like ``prefetch_related_objects``, aggregates are
+    computed with a query over ``pk__in`` batches, grouped by primary key only, so
+    other columns of the instances are neither fetched nor grouped again. Batches
+    are split to fit the database limit on the number of query parameters (e.g.,
+    999 on SQLite).
+
+    Args:
+        instances: model instances, all of the same model.
+        using: database alias. Defaults to the database the first instance was
+            loaded from.
+        batch_size: maximum number of instances per query. Defaults to as many as
+            the database allows.
+        **aggregates: JSON aggregates, as they would be passed to annotate.
+
+    Raises:
+        ValueError: if instances are of different models or not saved, or if
+            ``batch_size`` isn't positive.
+    """
+    if batch_size is not None and batch_size < 1:
+        raise ValueError("'batch_size' must be a positive integer.")
+    instances = list(instances)
+    if not instances or not aggregates:
+        return
+    model = type(instances[0])
+    if any(type(instance) is not model for instance in instances):
+        raise ValueError("Instances must all be of the same model.")
+    if any(instance.pk is None for instance in instances):
+        raise ValueError("Instances must be saved to compute their aggregates.")
+    using = using or instances[0]._state.db or "default"
+    names = list(aggregates)
+    queryset = (
+        model._default_manager.using(using)
+        .values("pk")
+        .annotate(**aggregates)
+        .values_list("pk", *names)
+        .order_by()
+    )
+
+    pks = list(dict.fromkeys(instance.pk for instance in instances))
+    batch_size = _batch_size(queryset, pks, using, batch_size)
+    values = {}
+    for start in range(0, len(pks), batch_size):
+        batch = pks[start : start + batch_size]
+        for pk, *row in queryset.filter(pk__in=batch):
+            values[pk] = row
+    for instance in instances:
+        if instance.pk in values:
+            row = values[instance.pk]
+        else:
+            # instances deleted in the meantime get the aggregates of an empty
+            # group, new values per instance so they don't share mutable values
+            row = [aggregates[name].output_field.get_default() for name in names]
+        for name, value in zip(names, row):
+            setattr(instance, name, value)
+
+
+def _batch_size(queryset, pks, using, batch_size):
+    batch_size = batch_size or len(pks)
+    max_query_params = connections[using].features.max_query_params
+    if max_query_params is None:
+        return batch_size
+    # other parameters come with aggregates (e.g., filters or JSON paths)
+    _, params = queryset.filter(pk__in=pks[:1]).query.sql_with_params()
+    return min(batch_size, max(max_query_params - len(params) + 1, 1))
@@ -2,11 +2,18 @@
 
 from __future__ import annotations
 
+import tempfile
+from pathlib import Path
+
 import django
 import pytest
 from django.conf import settings
 
 
+# extra databases sharing the default schema, used to test multi-database features
+SHARD_ALIASES = ("shard_1", "shard_2")
+
+
 def pytest_addoption(parser: pytest.Parser):
     """Customize pytest arguments."""
     # db options
@@ -31,6 +38,9 @@ def pytest_configure(config: pytest.Config):
         DEBUG_PROPAGATE_EXCEPTIONS=True,
         DATABASES={
             "default": db_settings,
+            **{
+                alias: get_shard_settings(db_settings, alias) for alias in SHARD_ALIASES
+            },
         },
         SITE_ID=1,
         SECRET_KEY="not a secret in tests",  # noqa: S106
@@ -90,3 +100,12 @@ def get_db_settings(config: pytest.Config):
 
     db_settings = settings_per_vendor[vendor_name]
     return db_settings
+
+
+def get_shard_settings(db_settings: dict, alias: str):
+    """Get django settings.DATABASE config for a shard database."""
+    if db_settings["ENGINE"] == "django.db.backends.sqlite3":
+        test_name = str(Path(tempfile.gettempdir()) / f"json_agg_{alias}.sqlite3")
+    else:
+        test_name = f"test_{db_settings['NAME']}_{alias}"
+    return {**db_settings, "TEST": {"NAME": test_name}}
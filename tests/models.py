@@ -22,3 +22,13 @@ class Author(models.Model):
     """Model representing a blog post Author."""
 
     name = models.CharField(max_length=100)
+
+
+class Comment(models.Model):
+    """Model representing a comment on a blog post."""
+
+    content = models.TextField()
+    created_at = models.DateTimeField(null=True)
+    post = models.ForeignKey(
+        "tests.Post", related_name="comments", on_delete=models.CASCADE
+    )
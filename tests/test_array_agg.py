@@ -9,6 +9,10 @@ from typing import TYPE_CHECKING
 import pytest
 from deepdiff import DeepDiff
 from django.db.models import DateTimeField
+from django.db.models import JSONField
+from django.db.models import Q
+from django.db.models import Value
+from django.db.models.functions import Upper
 
 from json_agg import JSONArrayAgg
 from tests.models import Author
@@ -170,3 +174,88 @@ def test_null_value_with_nested_output_field(faker: Faker):
 
     assert annotated_result.json_array == [None]
     assert annotated_result.name == author_name
+
+
+@pytest.mark.django_db
+def test_skip_null_values(faker: Faker):
+    """Test JSONArrayAgg skipping null values."""
+    author = Author.objects.create(name=faker.name())
+    Post.objects.create(title=faker.slug(), author=author, content=None)
+    Post.objects.create(title=faker.slug(), author=author, content="content")
+
+    annotated_result = Author.objects.annotate(
+        json_array=JSONArrayAgg("posts__content", skip_null_values=True),
+        filtered_array=JSONArrayAgg(
+            Upper("posts__content"),
+            filter=Q(posts__content__startswith="c"),
+            skip_null_values=True,
+        ),
+    ).first()
+
+    assert annotated_result.json_array == ["content"]
+    assert annotated_result.filtered_array == ["CONTENT"]
+
+
+@pytest.mark.django_db
+def test_strip_nulls(faker: Faker):
+    """Test JSONArrayAgg removing null object members, keeping null elements."""
+    author = Author.objects.create(name=faker.name())
+    Post.objects.create(
+        title=faker.slug(), author=author, metadata={"a": None, "b": [None, {"c": 1}]}
+    )
+    Post.objects.create(title=faker.slug(), author=author, metadata={})
+
+    annotated_result = Author.objects.annotate(
+        json_array=JSONArrayAgg("posts__metadata", sqlite_func="json", strip_nulls=True)
+    ).first()
+
+    assert sorted(annotated_result.json_array, key=len) == [
+        {},
+        {"b": [None, {"c": 1}]},
+    ]
+
+
+@pytest.mark.django_db
+def test_keys_projection(faker: Faker):
+    """Test JSONArrayAgg projecting JSON values to the given paths."""
+    author = Author.objects.create(name=faker.name())
+    Post.objects.create(
+        title=faker.slug(),
+        author=author,
+        metadata={
+            "a": [1, "two"],
+            "b": {"c": True, "d": "dropped"},
+            "e": "dropped",
+            "key with spaces": 1.5,
+        },
+    )
+    Post.objects.create(title=faker.slug(), author=author, metadata={"a": "only a"})
+    null_post = Post.objects.create(title=faker.slug(), author=author)
+    Post.objects.filter(pk=null_post.pk).update(metadata=Value(None, JSONField()))
+    no_posts = Author.objects.create(name=faker.name())
+
+    annotated_result = Author.objects.annotate(
+        json_array=JSONArrayAgg("posts__metadata", keys=["a", "b.c", "key with spaces"])
+    ).in_bulk()
+
+    assert sorted(annotated_result[author.pk].json_array, key=repr) == [
+        None,
+        {"a": "only a", "b": {"c": None}, "key with spaces": None},
+        {"a": [1, "two"], "b": {"c": True}, "key with spaces": 1.5},
+    ]
+    assert annotated_result[no_posts.pk].json_array == [None]
+
+
+@pytest.mark.parametrize(
+    "keys,message",
+    [
+        ([], "non-empty list"),
+        ("a", "non-empty list"),
+        (["a", "a.b"], "Overlapping"),
+        (["a.b", "a"], "Overlapping"),
+    ],
+)
+def test_raise_value_error_invalid_keys(keys, message: str):
+    """Ensure ValueError is raised for invalid projection keys."""
+    with pytest.raises(ValueError, match=message):
+        JSONArrayAgg("posts__metadata", keys=keys)
@@ -0,0 +1,144 @@
+"""Test aiter_decoded helper."""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.db.models import CharField
+from django.db.models import DateTimeField
+from django.db.models import IntegerField
+from django.db.models import Q
+from django.db.models import QuerySet
+
+from json_agg import JSONArrayAgg
+from json_agg import JSONObjectAgg
+from json_agg import aiter_decoded
+from tests.models import Author
+from tests.post_factory import post_factory
+
+
+if TYPE_CHECKING:
+    from faker import Faker
+
+
+_decoding_threads = set()
+
+
+class _ThreadRecordingField(CharField):
+    def to_python(self, value):
+        _decoding_threads.add(threading.current_thread().name)
+        return super().to_python(value)
+
+
+class _ClosingIterator:
+    def __init__(self, iterator):
+        self.iterator = iterator
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.iterator)
+
+    def close(self):
+        self.closed = True
+        self.iterator.close()
+
+
+async def _collect(queryset, **kwargs):
+    return [row async for row in aiter_decoded(queryset, **kwargs)]
+
+
+@pytest.mark.django_db
+def test_same_result_as_queryset(faker: Faker):
+    """Test aiter_decoded yields the same values as evaluating the queryset."""
+    post_factory(faker, value_name="updated_at", value_factory=faker.date_time)
+    Author.objects.create(name="no posts")
+    queryset = Author.objects.annotate(
+        post_map=JSONObjectAgg(
+            "posts__title", "posts__updated_at", nested_output_field=DateTimeField()
+        ),
+        titles=JSONArrayAgg("posts__title"),
+    ).order_by("name")
+
+    expected = [(a.name, a.post_map, a.titles) for a in queryset]
+    authors = async_to_sync(_collect)(queryset, chunk_size=3)
+
+    assert [(a.name, a.post_map, a.titles) for a in authors] == expected
+
+
+@pytest.mark.django_db
+def test_conversions(faker: Faker):
+    """Test aiter_decoded converts keys, values and empty payloads."""
+    post_factory(faker, value_name="year", value_factory=faker.pyint)
+    Author.objects.create(name="no posts")
+    queryset = Author.objects.annotate(
+        years=JSONObjectAgg(
+            "posts__year", "posts__title", key_output_field=IntegerField()
+        ),
+        future_titles=JSONArrayAgg("posts__title", filter=Q(posts__year__gte=10000)),
+        future_dates=JSONArrayAgg(
+            "posts__updated_at",
+            filter=Q(posts__year__gte=10000),
+            nested_output_field=DateTimeField(),
+        ),
+    ).order_by("name")
+
+    authors = async_to_sync(_collect)(queryset)
+
+    assert [(a.name, a.years, a.future_titles, a.future_dates) for a in authors] == [
+        (a.name, a.years, a.future_titles, a.future_dates) for a in queryset
+    ]
+
+
+@pytest.mark.django_db
+def test_decode_on_executor(faker: Faker):
+    """Test payloads are decoded on the given executor."""
+    post_factory(faker, value_name="content", value_factory=faker.paragraph)
+    queryset = Author.objects.values("name").annotate(
+        contents=JSONArrayAgg(
+            "posts__content", nested_output_field=_ThreadRecordingField()
+        )
+    )
+
+    _decoding_threads.clear()
+    with ThreadPoolExecutor(thread_name_prefix="json-agg-decoder") as executor:
+        result = async_to_sync(_collect)(queryset, executor=executor)
+
+    assert {t.split("_")[0] for t in _decoding_threads} == {"json-agg-decoder"}
+    assert sorted(result, key=lambda r: r["name"]) == sorted(
+        queryset, key=lambda r: r["name"]
+    )
+
+
+@pytest.mark.django_db
+def test_stop_iteration_early(faker: Faker, monkeypatch: pytest.MonkeyPatch):
+    """Test closing the iterator early closes the underlying queryset iterator."""
+    post_factory(faker, value_name="year", value_factory=faker.pyint)
+    queryset = Author.objects.annotate(years=JSONArrayAgg("posts__year"))
+    iterators = []
+    queryset_iterator = QuerySet.iterator
+
+    def _iterator(self, *args, **kwargs):
+        iterator = _ClosingIterator(queryset_iterator(self, *args, **kwargs))
+        iterators.append(iterator)
+        return iterator
+
+    monkeypatch.setattr(QuerySet, "iterator", _iterator)
+
+    async def _first():
+        rows = aiter_decoded(queryset, chunk_size=2)
+        author = await rows.__anext__()
+        await rows.aclose()
+        return author
+
+    author = async_to_sync(_first)()
+
+    (iterator,) = iterators
+    assert iterator.closed
+    assert author.years == queryset.get(pk=author.pk).years
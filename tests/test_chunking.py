@@ -0,0 +1,146 @@
+"""Test chunked JSON aggregates."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+from django.db import connection
+from django.db.models import DateTimeField
+from django.db.models import Q
+from django.db.models import Value
+from django.test.utils import CaptureQueriesContext
+
+from json_agg import JSONArrayAgg
+from json_agg import JSONObjectAgg
+from json_agg import JSONRowAgg
+from json_agg import iter_json_agg_chunks
+from json_agg import iter_json_agg_groups
+from json_agg.chunking import _supports_aggregate_order_by
+from tests.models import Author
+from tests.models import Post
+from tests.post_factory import post_factory
+
+
+if TYPE_CHECKING:
+    from faker import Faker
+
+
+def _aggregates():
+    return {
+        "post_map": JSONObjectAgg("posts__title", "posts__content"),
+        "titles": JSONArrayAgg("posts__title", filter=Q(posts__year__gte=2000)),
+        "dates": JSONArrayAgg("posts__updated_at", nested_output_field=DateTimeField()),
+        "rows": JSONRowAgg(title="posts__title", metadata="posts__metadata"),
+        "projected": JSONArrayAgg("posts__metadata", keys=["a"]),
+    }
+
+
+def _sorted(value):
+    if isinstance(value, list):
+        return sorted(value, key=repr)
+    return value
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", list(_aggregates()))
+def test_groups_same_as_annotate(faker: Faker, name: str):
+    """Test reassembled chunks are the same as the annotated aggregate."""
+    post_factory(
+        faker,
+        value_name="content",
+        value_factory=faker.sentence,
+        number_of_authors=3,
+        number_of_posts=7,
+    )
+    Post.objects.update(
+        updated_at=faker.date_time(), metadata={"a": 1, "b": [True]}, year=2020
+    )
+    no_posts = Author.objects.create(name="no posts")
+    aggregate = _aggregates()[name]
+
+    result = {
+        pk: _sorted(value)
+        for pk, value in iter_json_agg_groups(
+            Author.objects.all(), aggregate, chunk_size=3
+        )
+    }
+
+    expected = {
+        author.pk: _sorted(getattr(author, name))
+        for author in Author.objects.annotate(**{name: aggregate})
+    }
+    if aggregate.filter is not None or isinstance(aggregate, JSONRowAgg):
+        # instances without aggregated rows are skipped
+        del expected[no_posts.pk]
+    assert result == expected
+
+
+@pytest.mark.django_db
+def test_chunks(faker: Faker):
+    """Test chunks are bounded, indexed and follow order_by."""
+    author = Author.objects.create(name=faker.name())
+    Post.objects.bulk_create(
+        Post(title=f"post-{i}", year=i, author=author) for i in range(8)
+    )
+    other_author = Author.objects.create(name=faker.name())
+    Post.objects.create(title="other", year=0, author=other_author)
+
+    chunks = list(
+        iter_json_agg_chunks(
+            Author.objects.filter(pk=author.pk),
+            JSONArrayAgg("posts__year"),
+            chunk_size=3,
+            order_by="-posts__year",
+        )
+    )
+
+    assert chunks == [
+        (author.pk, 0, [7, 6, 5]),
+        (author.pk, 1, [4, 3, 2]),
+        (author.pk, 2, [1, 0]),
+    ]
+
+
+@pytest.mark.django_db
+def test_chunks_ordered_aggregate(faker: Faker):
+    """Test the aggregate orders rows within chunks where supported."""
+    author = Author.objects.create(name=faker.name())
+    Post.objects.bulk_create(
+        Post(title=f"post-{i}", year=i, author=author) for i in range(4)
+    )
+
+    with CaptureQueriesContext(connection) as queries:
+        chunks = list(
+            iter_json_agg_chunks(
+                Author.objects.all(),
+                JSONArrayAgg("posts__year"),
+                chunk_size=3,
+                order_by="-posts__year",
+            )
+        )
+
+    assert chunks == [(author.pk, 0, [3, 2, 1]), (author.pk, 1, [0])]
+    ordered = f"ORDER BY {connection.ops.quote_name('_json_agg_row')})"
+    assert (ordered in queries[-1]["sql"]) == _supports_aggregate_order_by(connection)
+
+
+@pytest.mark.django_db
+def test_chunks_empty_queryset():
+    """Test no chunk is produced for an empty queryset."""
+    aggregate = JSONArrayAgg("posts__year")
+    assert list(iter_json_agg_chunks(Author.objects.none(), aggregate)) == []
+
+
+def test_chunks_invalid_arguments():
+    """Ensure invalid arguments raise errors."""
+    with pytest.raises(ValueError, match="chunk_size"):
+        next(
+            iter_json_agg_chunks(
+                Author.objects.all(), JSONArrayAgg("posts__year"), chunk_size=0
+            )
+        )
+    with pytest.raises(TypeError, match="JSON aggregate"):
+        next(iter_json_agg_chunks(Author.objects.all(), Value(1)))
+    with pytest.raises(ValueError, match="order_by"):
+        next(iter_json_agg_chunks(Author.objects.all(), JSONArrayAgg(Value(1))))
@@ -0,0 +1,204 @@
+"""Test CompiledQuery."""
+
+from __future__ import annotations
+
+import threading
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+
+import pytest
+from django.db import connection
+from django.db.models import CharField
+from django.db.models import IntegerField
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from json_agg import CompiledQuery
+from json_agg import JSONArrayAgg
+from json_agg import JSONObjectAgg
+from json_agg import Param
+from json_agg import compiled as compiled_module
+from json_agg.compiled import _can_prepare
+from tests.models import Author
+from tests.models import Post
+from tests.post_factory import post_factory
+
+
+if TYPE_CHECKING:
+    from faker import Faker
+
+
+def _queryset(name, min_year):
+    return Author.objects.filter(name=name).annotate(
+        post_map=JSONObjectAgg(
+            "posts__title", "posts__year", filter=Q(posts__year__gte=min_year)
+        ),
+        titles=JSONArrayAgg("posts__title"),
+    )
+
+
+@pytest.mark.django_db
+def test_same_result_as_queryset(faker: Faker):
+    """Test executions return the same rows as the queryset with the values."""
+    expected_value_per_author_name = post_factory(
+        faker, value_name="year", value_factory=faker.pyint
+    )
+    compiled = CompiledQuery(
+        _queryset(Param("name"), Param("min_year", output_field=IntegerField()))
+    )
+
+    for name in expected_value_per_author_name:
+        min_year = faker.pyint()
+        expected = [(a.name, a.post_map, a.titles) for a in _queryset(name, min_year)]
+        authors = compiled.execute(name=name, min_year=str(min_year))
+        assert [(a.name, a.post_map, a.titles) for a in authors] == expected
+
+
+@pytest.mark.django_db
+def test_sql_compiled_once(faker: Faker, monkeypatch: pytest.MonkeyPatch):
+    """Test the queryset is only compiled on the first execution."""
+    post_factory(faker, value_name="content", value_factory=faker.word)
+    compiled = CompiledQuery(
+        Author.objects.values("name")
+        .filter(name__startswith=Param("prefix", output_field=CharField()))
+        .annotate(contents=JSONArrayAgg("posts__content"))
+    )
+    compiled.execute(prefix="")
+    monkeypatch.setattr(JSONArrayAgg, "as_sql", pytest.fail, raising=True)
+
+    with CaptureQueriesContext(connection) as context:
+        rows = compiled.execute(prefix="")
+        assert compiled.execute(prefix="no author has this prefix") == []
+
+    assert len(rows) == Author.objects.count()
+    assert len(context) == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_compiled_per_thread(faker: Faker):
+    """Test each thread compiles the query for its own connection."""
+    post_factory(faker, value_name="content", value_factory=faker.word)
+    compiled = CompiledQuery(
+        Author.objects.filter(pk=Param("pk")).annotate(
+            contents=JSONArrayAgg("posts__content")
+        )
+    )
+    author = Author.objects.first()
+    results = []
+
+    def _execute():
+        results.extend(compiled.execute(pk=author.pk))
+
+    thread = threading.Thread(target=_execute)
+    thread.start()
+    thread.join()
+    results.extend(compiled.execute(pk=author.pk))
+
+    assert [a.pk for a in results] == [author.pk, author.pk]
+
+
+@pytest.mark.django_db
+def test_prefetch_related(faker: Faker):
+    """Test prefetch_related lookups are applied to the rows."""
+    post_factory(faker, value_name="content", value_factory=faker.word)
+    compiled = CompiledQuery(
+        Author.objects.filter(name=Param("name"))
+        .annotate(contents=JSONArrayAgg("posts__content"))
+        .prefetch_related("posts")
+    )
+    author = Author.objects.first()
+
+    (result,) = compiled.execute(name=author.name)
+
+    assert sorted(p.content for p in result.posts.all()) == sorted(result.contents)
+
+
+class _PreparingCursor:
+    """Database cursor stub accepting psycopg 3 ``prepare``."""
+
+    def __init__(self, cursor, prepared):
+        self.cursor = cursor
+        self.prepared = prepared
+
+    def execute(self, sql, params, prepare=False):
+        self.prepared.append((sql, prepare))
+        return self.cursor.execute(sql, params)
+
+
+@pytest.mark.django_db
+def test_prepared_statement(faker: Faker, monkeypatch: pytest.MonkeyPatch):
+    """Test the compiled statement, and only it, is prepared by the server."""
+    post_factory(faker, value_name="content", value_factory=faker.word)
+    monkeypatch.setattr(compiled_module, "_can_prepare", lambda connection: True)
+    compiled = CompiledQuery(
+        Author.objects.filter(name=Param("name"))
+        .annotate(contents=JSONArrayAgg("posts__content"))
+        .prefetch_related("posts")
+    )
+    author = Author.objects.first()
+    prepared = []
+
+    def _stub_cursor(execute, sql, params, many, context):
+        context["cursor"] = SimpleNamespace(
+            cursor=_PreparingCursor(context["cursor"].cursor, prepared)
+        )
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(_stub_cursor):
+        (result,) = compiled.execute(name=author.name)
+        compiled.execute(name=author.name)
+
+    assert sorted(p.content for p in result.posts.all()) == sorted(result.contents)
+    compiled_query = compiled._get_compiled(connection.alias)
+    assert prepared == [(compiled_query.sql, True)] * 2
+
+    # other statements (e.g., executed by signals) aren't prepared
+    def _execute(*args):
+        return args
+
+    for sql, many in [("SELECT 1", False), (compiled_query.sql, True)]:
+        args = (sql, [], many, {})
+        assert compiled_query.prepare_wrapper(_execute, *args) == args
+
+
+def test_param_repr():
+    """Test parameters are represented by their name."""
+    assert repr(Param("name")) == "Param('name')"
+
+
+@pytest.mark.django_db
+def test_empty_result_set():
+    """Test queries that can't match rows aren't executed."""
+    compiled = CompiledQuery(Author.objects.filter(name=Param("name"), pk__in=[]))
+
+    with CaptureQueriesContext(connection) as context:
+        assert compiled.execute(name="name") == []
+
+    assert len(context) == 0
+
+
+def test_missing_param():
+    """Ensure ValueError is raised when a parameter value is missing."""
+    compiled = CompiledQuery(Post.objects.filter(title=Param("title")))
+
+    with pytest.raises(ValueError, match="Missing value for parameter 'title'"):
+        compiled.execute()
+
+
+@pytest.mark.parametrize(
+    "vendor,options,expected",
+    [
+        ("sqlite", {}, False),
+        ("postgresql", {}, False),
+        ("postgresql", {"server_side_binding": True}, "psycopg3"),
+    ],
+)
+def test_can_prepare(vendor, options, expected, monkeypatch: pytest.MonkeyPatch):
+    """Test statements are only prepared with psycopg 3 server side binding."""
+    if expected == "psycopg3":
+        psycopg_any = pytest.importorskip("django.db.backends.postgresql.psycopg_any")
+        expected = psycopg_any.is_psycopg3
+    monkeypatch.setattr(connection, "vendor", vendor)
+    monkeypatch.setitem(connection.settings_dict, "OPTIONS", options)
+
+    assert _can_prepare(connection) is expected
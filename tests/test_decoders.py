@@ -0,0 +1,153 @@
+"""Test nested_output_field decoders."""
+
+from __future__ import annotations
+
+import decimal
+from typing import TYPE_CHECKING
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.db.models import BigIntegerField
+from django.db.models import BooleanField
+from django.db.models import CharField
+from django.db.models import DateField
+from django.db.models import DateTimeField
+from django.db.models import DecimalField
+from django.db.models import Field
+from django.db.models import FloatField
+from django.db.models import IntegerField
+from django.db.models import UUIDField
+
+from json_agg import JSONArrayAgg
+from json_agg import JSONObjectAgg
+from json_agg import register_decoder
+from json_agg.decoders import _registry
+from json_agg.decoders import get_decoder
+from tests.models import Author
+from tests.post_factory import post_factory
+
+
+if TYPE_CHECKING:
+    from faker import Faker
+
+
+class _GenericDateTimeField(DateTimeField):
+    def to_python(self, value):
+        return super().to_python(value)
+
+
+class _ReversedField(CharField):
+    pass
+
+
+def _to_python(field: Field, values: list):
+    try:
+        return [field.to_python(v) for v in values]
+    except ValidationError as e:
+        return e.messages
+
+
+def _decode(field: Field, values: list):
+    try:
+        return get_decoder(field)(values)
+    except ValidationError as e:
+        return e.messages
+
+
+@pytest.mark.parametrize(
+    "field,values",
+    [
+        (IntegerField(), [1, None, -5, 2.7, True, "42"]),
+        (IntegerField(), [1, "one"]),
+        (BigIntegerField(), [2**40, None]),
+        (FloatField(), [1.5, 2, None, "3.25"]),
+        (FloatField(), [1.5, []]),
+        (BooleanField(), [True, False, 1, 0, 1.0]),
+        (BooleanField(), [True, "t", "0"]),
+        (BooleanField(), [True, None]),
+        (BooleanField(null=True), [True, None, ""]),
+        (BooleanField(), [True, 2]),
+        (DecimalField(max_digits=5, decimal_places=2), [1.1, 3, "2.50", None]),
+        (DecimalField(max_digits=3, decimal_places=1), [12.3456, 1e20]),
+        (DecimalField(max_digits=5, decimal_places=2), [1.1, "NaN"]),
+        (DecimalField(max_digits=5, decimal_places=2), [1.1, "nope"]),
+        (UUIDField(), ["0b2fa1ab-4ee4-4bcf-b8c6-e4ecfb8ed1c6", None]),
+        (UUIDField(), ["0b2fa1ab4ee44bcfb8c6e4ecfb8ed1c6", 42]),
+        (UUIDField(), ["not an uuid"]),
+        (DateField(), ["2023-05-17", None]),
+        (DateField(), ["2023-05-17", "2023-05-17T10:00:00"]),
+        (DateField(), ["2023-02-30"]),
+        (DateTimeField(), ["2023-05-17T10:00:00", "2023-05-17 10:00:00.5+02:00"]),
+        (DateTimeField(), ["2023-05-17T10:00:00.123456Z", None, "2023-05-17"]),
+        (DateTimeField(), ["2023-05-17T10:00:00", "yesterday"]),
+    ],
+)
+def test_same_values_as_to_python(field: Field, values: list):
+    """Test registered decoders return the same values as to_python."""
+    expected = _to_python(field, values)
+    result = _decode(field, values)
+
+    assert result == expected
+    assert [type(v) for v in result] == [type(v) for v in expected]
+
+
+def test_to_python_override_is_used():
+    """Test decoders aren't used by fields overriding to_python."""
+    assert get_decoder(_GenericDateTimeField()).__qualname__.startswith(
+        "_to_python_decoder"
+    )
+    assert get_decoder(DateTimeField()).__qualname__.startswith("_with_fallback")
+
+
+@pytest.fixture
+def reversed_decoder(monkeypatch: pytest.MonkeyPatch):
+    """Register a decoder reversing strings for _ReversedField."""
+    monkeypatch.setattr("json_agg.decoders._registry", dict(_registry))
+
+    def decoder_factory(field):
+        return lambda values: [v[::-1] for v in values]
+
+    register_decoder(_ReversedField, decoder_factory)
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("reversed_decoder")
+def test_register_decoder(faker: Faker):
+    """Test registered decoders are used by JSON aggregates."""
+    expected_value_per_author_name = post_factory(
+        faker, value_name="content", value_factory=faker.word
+    )
+    authors = Author.objects.annotate(
+        contents=JSONArrayAgg("posts__content", nested_output_field=_ReversedField()),
+        post_map=JSONObjectAgg(
+            "posts__title", "posts__content", nested_output_field=_ReversedField()
+        ),
+    )
+
+    for author in authors:
+        expected_values = expected_value_per_author_name[author.name].values()
+        assert sorted(author.contents) == sorted(v[::-1] for v in expected_values)
+        assert sorted(author.post_map.values()) == sorted(author.contents)
+
+
+@pytest.mark.django_db
+def test_aggregate_same_result_as_to_python(faker: Faker):
+    """Test aggregates decode nested values like the generic to_python path."""
+    post_factory(faker, value_name="updated_at", value_factory=faker.date_time)
+
+    def _annotate(field_class):
+        return Author.objects.annotate(
+            post_map=JSONObjectAgg(
+                "posts__title", "posts__updated_at", nested_output_field=field_class()
+            )
+        ).order_by("pk")
+
+    expected = [a.post_map for a in _annotate(_GenericDateTimeField)]
+
+    assert [a.post_map for a in _annotate(DateTimeField)] == expected
+
+
+def test_register_decoder_invalid_field_class():
+    """Ensure TypeError is raised when registering something else than a Field."""
+    with pytest.raises(TypeError, match="Field class"):
+        register_decoder(decimal.Decimal, lambda field: list)
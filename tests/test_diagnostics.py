@@ -0,0 +1,123 @@
+"""Test explain diagnostics."""
+
+from __future__ import annotations
+
+import pytest
+from django.db import connection
+from django.db.models import F
+from django.db.models import Q
+
+from json_agg import JSONArrayAgg
+from json_agg import JSONObjectAgg
+from json_agg import JSONRowAgg
+from json_agg import explain
+from json_agg.diagnostics import FULL_SCAN
+from json_agg.diagnostics import TEMP_SORT
+from json_agg.diagnostics import IndexSuggestion
+from json_agg.diagnostics import _sqlite_issues
+from tests.models import Author
+from tests.models import Post
+
+
+@pytest.mark.django_db
+def test_suggest_join_and_filter_index():
+    """Test an index covering the join and the filters is suggested."""
+    queryset = Author.objects.annotate(
+        json_obj=JSONObjectAgg(
+            "posts__title", "posts__content", filter=Q(posts__year=2000)
+        )
+    )
+
+    report = explain(queryset)
+
+    assert report.plan == queryset.explain()
+    assert report.suggestions == [IndexSuggestion(Post, ("author", "year", "title"))]
+    assert str(report.suggestions[0]) in str(report)
+
+
+@pytest.mark.django_db
+def test_no_suggestion_with_existing_index():
+    """Test no index is suggested when an existing one covers the aggregate."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE INDEX json_agg_test_idx ON tests_post (author_id, title, year)"
+        )
+    queryset = Author.objects.annotate(
+        json_obj=JSONObjectAgg("posts__title", "posts__content")
+    )
+
+    assert explain(queryset).suggestions == []
+
+
+@pytest.mark.django_db
+def test_full_scan_on_aggregated_table():
+    """Test full scans of the aggregated table are reported."""
+    queryset = Post.objects.values("year").annotate(titles=JSONArrayAgg("title"))
+
+    report = explain(queryset)
+
+    assert [i.table for i in report.issues if i.kind == FULL_SCAN] == ["tests_post"]
+    assert report.suggestions == [IndexSuggestion(Post, ("year",))]
+
+
+@pytest.mark.django_db
+def test_suggest_ordering_index():
+    """Test ordering columns of aggregated tables are part of suggestions."""
+    on_base_table = (
+        Post.objects.values("year")
+        .annotate(titles=JSONArrayAgg("title"))
+        .order_by("year", "updated_at")
+    )
+    on_joined_table = Author.objects.annotate(
+        titles=JSONArrayAgg("posts__title")
+    ).order_by(F("posts__updated_at"))
+
+    assert explain(on_base_table).suggestions == [
+        IndexSuggestion(Post, ("year", "updated_at"))
+    ]
+    assert explain(on_joined_table).suggestions == [
+        IndexSuggestion(Post, ("author", "updated_at"))
+    ]
+
+
+@pytest.mark.django_db
+def test_sort_on_aggregated_table():
+    """Test sorts of the aggregated table are reported, not other sorts."""
+    on_base_table = Author.objects.annotate(
+        titles=JSONArrayAgg("posts__title")
+    ).order_by("name")
+    on_aggregated_table = Post.objects.values("year").annotate(
+        titles=JSONArrayAgg("title")
+    )
+
+    assert [i for i in explain(on_base_table).issues if i.kind == TEMP_SORT] == []
+    if connection.vendor == "sqlite":
+        issues = explain(on_aggregated_table).issues
+        assert [i.table for i in issues if i.kind == TEMP_SORT] == ["tests_post"]
+
+
+@pytest.mark.django_db
+def test_no_primary_key_suggestion():
+    """Test the primary key filter of JSONRowAgg isn't part of suggestions."""
+    queryset = Author.objects.annotate(rows=JSONRowAgg(title="posts__title"))
+
+    assert explain(queryset).suggestions == []
+
+
+def test_sqlite_legacy_plan():
+    """Test plans of SQLite < 3.36, which name tables with "TABLE"."""
+    issues = _sqlite_issues(
+        "SCAN TABLE tests_post\nSEARCH TABLE tests_author USING AUTOMATIC INDEX"
+    )
+
+    assert [i.table for i in issues] == ["tests_post", "tests_author"]
+
+
+@pytest.mark.django_db
+def test_unsupported_vendor(monkeypatch: pytest.MonkeyPatch):
+    """Ensure ValueError is raised for unsupported database vendors."""
+    queryset = Author.objects.annotate(titles=JSONArrayAgg("posts__title"))
+    monkeypatch.setattr(connection, "vendor", "oracle")
+
+    with pytest.raises(ValueError, match="not supported"):
+        explain(queryset)
@@ -0,0 +1,143 @@
+"""Test fan_out helper."""
+
+from __future__ import annotations
+
+from functools import partial
+from typing import TYPE_CHECKING
+
+import pytest
+from django.db.models import OuterRef
+
+from json_agg import JSONAggSubquery
+from json_agg import JSONArrayAgg
+from json_agg import JSONObjectAgg
+from json_agg import fan_out
+from json_agg.fanout import _merge
+from tests.conftest import SHARD_ALIASES
+from tests.models import Author
+from tests.models import Post
+
+
+if TYPE_CHECKING:
+    from faker import Faker
+
+
+shard_db = pytest.mark.django_db(transaction=True, databases=list(SHARD_ALIASES))
+
+
+def _create_posts(alias: str, author_name: str, posts: dict):
+    author = Author.objects.using(alias).create(name=author_name)
+    Post.objects.using(alias).bulk_create(
+        Post(title=title, content=content, author=author)
+        for title, content in posts.items()
+    )
+
+
+@shard_db
+def test_merge_object_agg(faker: Faker):
+    """Test JSONObjectAgg values are merged per group across databases."""
+    shard_1_posts = {faker.slug(): faker.paragraph() for _ in range(3)}
+    shard_2_posts = {faker.slug(): faker.paragraph() for _ in range(3)}
+    _create_posts("shard_1", "shared", shard_1_posts)
+    _create_posts("shard_2", "shared", shard_2_posts)
+    _create_posts("shard_2", "only-shard-2", {"title": "content"})
+
+    queryset = Author.objects.annotate(
+        post_map=JSONObjectAgg("posts__title", "posts__content")
+    )
+    authors = fan_out(queryset, SHARD_ALIASES, key="name")
+
+    assert {author.name: author.post_map for author in authors} == {
+        "shared": {**shard_1_posts, **shard_2_posts},
+        "only-shard-2": {"title": "content"},
+    }
+
+
+@shard_db
+def test_concatenate_array_agg(faker: Faker):
+    """Test JSONArrayAgg values are concatenated following the alias order."""
+    _create_posts("shard_1", "shared", {"a": None, "b": None})
+    _create_posts("shard_2", "shared", {"c": None})
+
+    queryset = (
+        Author.objects.values("name")
+        .annotate(titles=JSONArrayAgg("posts__title"))
+        .order_by("name")
+    )
+
+    assert fan_out(queryset, SHARD_ALIASES, key="name") == [
+        {"name": "shared", "titles": ["a", "b", "c"]}
+    ]
+    assert fan_out(queryset, SHARD_ALIASES[::-1], key="name") == [
+        {"name": "shared", "titles": ["c", "a", "b"]}
+    ]
+
+
+@shard_db
+def test_merge_subquery():
+    """Test JSONAggSubquery values are merged like their aggregate."""
+    _create_posts("shard_1", "shared", {"a": None})
+    _create_posts("shard_2", "shared", {"b": None, "c": None})
+
+    queryset = Author.objects.annotate(
+        titles=JSONAggSubquery(
+            Post.objects.filter(author=OuterRef("pk")).order_by("title"),
+            JSONArrayAgg("title"),
+        )
+    )
+    (author,) = fan_out(queryset, SHARD_ALIASES, key="name")
+    assert sorted(author.titles) == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("aggregate", [JSONArrayAgg("a"), JSONObjectAgg("a", "b")])
+def test_merge_null_values(aggregate):
+    """Test null aggregates (e.g., filtered JSONB_AGG without rows) are ignored."""
+    value = [1] if isinstance(aggregate, JSONArrayAgg) else {"a": 1}
+    merge = partial(_merge, aggregate, on_conflict="raise", group="group")
+
+    assert merge(value, None) == value
+    assert merge(None, value) == value
+    assert merge(None, None) is None
+
+
+@shard_db
+@pytest.mark.parametrize(
+    "on_conflict,expected_content", [("first", "shard-1"), ("last", "shard-2")]
+)
+def test_conflict_policy(on_conflict: str, expected_content: str):
+    """Test keys found in several databases are resolved with on_conflict."""
+    _create_posts("shard_1", "shared", {"title": "shard-1"})
+    _create_posts("shard_2", "shared", {"title": "shard-2"})
+
+    queryset = Author.objects.annotate(
+        post_map=JSONObjectAgg("posts__title", "posts__content")
+    )
+    (author,) = fan_out(queryset, SHARD_ALIASES, key="name", on_conflict=on_conflict)
+
+    assert author.post_map == {"title": expected_content}
+
+
+@shard_db
+def test_conflict_raise():
+    """Test the default conflict policy raises ValueError."""
+    _create_posts("shard_1", "shared", {"title": "shard-1"})
+    _create_posts("shard_2", "shared", {"title": "shard-2"})
+
+    queryset = Author.objects.annotate(
+        post_map=JSONObjectAgg("posts__title", "posts__content")
+    )
+    with pytest.raises(ValueError, match="Conflicting values"):
+        fan_out(queryset, SHARD_ALIASES, key="name")
+
+
+def test_invalid_on_conflict():
+    """Ensure ValueError is raised for unknown conflict policies."""
+    with pytest.raises(ValueError, match="Invalid on_conflict"):
+        fan_out(Author.objects.all(), SHARD_ALIASES, on_conflict="merge")
+
+
+def test_values_list_queryset():
+    """Ensure ValueError is raised for values_list() querysets."""
+    queryset = Author.objects.annotate(titles=JSONArrayAgg("posts__title"))
+    with pytest.raises(ValueError, match="values"):
+        fan_out(queryset.values_list("name", "titles"), SHARD_ALIASES)
@@ -0,0 +1,205 @@
+"""Test annotate_json and the python grouping engine."""
+
+from __future__ import annotations
+
+import datetime
+from functools import partial
+from typing import TYPE_CHECKING
+
+import pytest
+from django.db import NotSupportedError
+from django.db import connection
+from django.db.models import CharField
+from django.db.models import DateTimeField
+from django.db.models import Q
+from django.db.models.functions import Cast
+from django.db.models.functions import Lower
+from django.db.models.functions import Upper
+
+from json_agg import JSONArrayAgg
+from json_agg import JSONObjectAgg
+from json_agg import JSONRowAgg
+from json_agg import annotate_json
+from json_agg.grouping import DATABASE
+from json_agg.grouping import PYTHON
+from json_agg.grouping import choose_strategy
+from json_agg.grouping import estimate_rows
+from tests.models import Author
+from tests.models import Post
+from tests.post_factory import post_factory
+
+
+if TYPE_CHECKING:
+    from faker import Faker
+
+
+def _aggregates():
+    return {
+        "post_map": JSONObjectAgg("posts__title", "posts__content"),
+        "titles": JSONArrayAgg("posts__title"),
+        "years": JSONArrayAgg("posts__year", filter=Q(posts__year__gte=2000)),
+        "metadata": JSONArrayAgg("posts__metadata", sqlite_func="json"),
+        "metadata_map": JSONObjectAgg("posts__title", "posts__metadata"),
+        "dates": JSONArrayAgg("posts__updated_at"),
+        "typed_dates": JSONArrayAgg(
+            "posts__updated_at", nested_output_field=DateTimeField()
+        ),
+    }
+
+
+def _as_dict(authors):
+    return {
+        author.name: {
+            name: sorted(value, key=repr) if isinstance(value, list) else value
+            for name, value in vars(author).items()
+            if name in _aggregates()
+        }
+        for author in authors
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("strategy", ["database", "python", "auto"])
+def test_same_result_per_strategy(faker: Faker, strategy: str, db_vendor: str):
+    """Test all strategies compute the same aggregates."""
+    post_factory(
+        faker,
+        value_name="year",
+        value_factory=partial(faker.pyint, min_value=1900, max_value=2100),
+    )
+    Post.objects.update(
+        content="content", updated_at=faker.date_time(), metadata={"a": [1]}
+    )
+    Author.objects.create(name="no posts")
+
+    authors = annotate_json(
+        Author.objects.filter(name__isnull=False), strategy=strategy, **_aggregates()
+    )
+
+    result = _as_dict(authors)
+    assert result == _as_dict(Author.objects.annotate(**_aggregates()))
+    # JSONB_AGG is null without rows (filtered here), JSON_GROUP_ARRAY is empty
+    assert result["no posts"]["years"] == (None if db_vendor == "postgresql" else [])
+    assert result["no posts"]["titles"] == [None]
+    for author in authors:
+        if author.name != "no posts":
+            assert isinstance(author.dates[0], str)
+            assert isinstance(author.typed_dates[0], datetime.datetime)
+
+
+@pytest.mark.django_db
+def test_python_strategy_empty_values_not_shared(faker: Faker):
+    """Test instances without rows don't share their (mutable) empty values."""
+    Author.objects.create(name=faker.name())
+    Author.objects.create(name=faker.name())
+
+    first, second = annotate_json(
+        Author.objects.all(),
+        strategy=PYTHON,
+        post_map=JSONObjectAgg("posts__title", "posts__content"),
+        titles=JSONArrayAgg("posts__title", filter=Q(posts__year__gte=0)),
+    )
+
+    assert first.post_map == second.post_map == {}
+    assert first.post_map is not second.post_map
+    if first.titles is not None:
+        assert first.titles is not second.titles
+
+
+@pytest.mark.django_db
+def test_python_strategy_unsupported_vendor(
+    faker: Faker, monkeypatch: pytest.MonkeyPatch
+):
+    """Test the python strategy is chosen when the vendor isn't supported."""
+    author = Author.objects.create(name=faker.name())
+    Post.objects.create(title="title", content="content", author=author)
+    aggregates = {"post_map": JSONObjectAgg("posts__title", "posts__content")}
+    monkeypatch.setattr(connection, "vendor", "unsupported")
+
+    with pytest.raises(NotSupportedError):
+        list(Author.objects.annotate(**aggregates))
+    assert choose_strategy(Author.objects.all(), aggregates.values()) == PYTHON
+    (result,) = annotate_json(Author.objects.all(), strategy=PYTHON, **aggregates)
+    assert result.post_map == {"title": "content"}
+
+
+@pytest.mark.django_db
+def test_choose_strategy_from_statistics(faker: Faker):
+    """Test strategy is chosen based on estimated group sizes."""
+    post_factory(
+        faker,
+        value_name="year",
+        value_factory=faker.pyint,
+        number_of_authors=5,
+        number_of_posts=20,
+    )
+    queryset = Author.objects.all()
+    aggregates = [JSONArrayAgg("posts__year")]
+    # no statistics
+    assert choose_strategy(queryset, aggregates, group_size_threshold=2) == DATABASE
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    assert estimate_rows(Post, "default") == 100
+    assert choose_strategy(queryset, aggregates, group_size_threshold=2) == PYTHON
+    assert choose_strategy(queryset, aggregates, group_size_threshold=50) == DATABASE
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "aggregate",
+    [
+        JSONArrayAgg("posts__metadata", keys=["x"]),
+        JSONRowAgg(title="posts__title"),
+        JSONArrayAgg(Upper("posts__title")),
+        JSONArrayAgg(Cast("posts__year", output_field=CharField())),
+        JSONArrayAgg("posts__metadata", strip_nulls=True),
+    ],
+)
+def test_auto_strategy_expressions_with_statistics(faker: Faker, aggregate):
+    """Test aggregates that can't be grouped python side use the database."""
+    post_factory(
+        faker,
+        value_name="year",
+        value_factory=faker.pyint,
+        number_of_authors=2,
+        number_of_posts=20,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    queryset = Author.objects.order_by("pk")
+
+    assert choose_strategy(queryset, [aggregate], group_size_threshold=2) == DATABASE
+    authors = annotate_json(queryset, json=aggregate)
+    assert [a.json for a in authors] == [
+        a.json for a in queryset.annotate(json=aggregate)
+    ]
+
+
+def test_invalid_strategy():
+    """Ensure ValueError is raised for unknown strategies."""
+    with pytest.raises(ValueError, match="Invalid strategy"):
+        annotate_json(Author.objects.all(), strategy="magic")
+
+
+@pytest.mark.django_db
+def test_python_strategy_values_queryset():
+    """Ensure ValueError is raised when rows aren't model instances."""
+    with pytest.raises(ValueError, match="model instances"):
+        annotate_json(
+            Author.objects.values("name"),
+            strategy=PYTHON,
+            titles=JSONArrayAgg("posts__title"),
+        )
+
+
+@pytest.mark.django_db
+def test_python_strategy_expressions():
+    """Ensure TypeError is raised for aggregates over arbitrary expressions."""
+    with pytest.raises(TypeError, match="field paths"):
+        annotate_json(
+            Author.objects.all(),
+            strategy=PYTHON,
+            titles=JSONArrayAgg(Lower("posts__title")),
+        )
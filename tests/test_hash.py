@@ -0,0 +1,69 @@
+"""Test JSONAggHash expression."""
+
+from __future__ import annotations
+
+import hashlib
+from typing import TYPE_CHECKING
+
+import pytest
+from django.db.models import TextField
+from django.db.models.functions import Cast
+
+from json_agg import JSONAggHash
+from json_agg import JSONArrayAgg
+from json_agg import JSONObjectAgg
+from tests.models import Author
+from tests.models import Post
+from tests.post_factory import post_factory
+
+
+if TYPE_CHECKING:
+    from faker import Faker
+
+
+def _hashes():
+    return dict(
+        Author.objects.alias(
+            post_map=JSONObjectAgg("posts__title", "posts__content")
+        ).values_list("name", JSONAggHash("post_map"))
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "aggregate",
+    [
+        JSONObjectAgg("posts__title", "posts__content"),
+        JSONArrayAgg("posts__year"),
+    ],
+)
+def test_hash(faker: Faker, aggregate):
+    """Test the hash is the MD5 digest of the aggregated JSON text."""
+    post_factory(faker, value_name="content", value_factory=faker.sentence)
+
+    queryset = Author.objects.annotate(
+        json_hash=JSONAggHash(aggregate), text=Cast(aggregate, TextField())
+    )
+
+    for author in queryset:
+        digest = hashlib.md5(author.text.encode()).hexdigest()  # noqa: S324
+        assert author.json_hash == digest
+
+
+@pytest.mark.django_db
+def test_hash_changes_with_aggregate(faker: Faker):
+    """Test the hash only changes for groups whose aggregate changed."""
+    post_factory(
+        faker, value_name="content", value_factory=faker.sentence, number_of_authors=2
+    )
+    hashes = _hashes()
+    assert len(set(hashes.values())) == len(hashes)
+    post = Post.objects.select_related("author").first()
+
+    assert _hashes() == hashes
+    Post.objects.filter(pk=post.pk).update(content="new content")
+    new_hashes = _hashes()
+
+    assert new_hashes[post.author.name] != hashes[post.author.name]
+    del new_hashes[post.author.name], hashes[post.author.name]
+    assert new_hashes == hashes
@@ -7,12 +7,23 @@ from functools import partial
 from typing import TYPE_CHECKING
 
 import pytest
+from django.db import connection
 from django.db.models import DateTimeField
+from django.db.models import IntegerField
 from django.db.models import JSONField
 from django.db.models import Q
+from django.db.models import Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+from django.db.models.sql.datastructures import Join
 
+from json_agg import JSONArrayAgg
 from json_agg import JSONObjectAgg
+from json_agg import parallel_decode
+from json_agg._joins import ConditionalJoin
+from json_agg._joins import get_outer_join
 from tests.models import Author
+from tests.models import Comment
 from tests.models import Post
 from tests.post_factory import post_factory
 
@@ -231,3 +242,277 @@ def test_with_filter(faker: Faker):
     ).first()
 
     assert annotated_result.json_obj == {post_title: post_content}
+
+
+def _create_authors_for_key_filter(faker: Faker):
+    with_posts = Author.objects.create(name="with posts")
+    Post.objects.create(title="title", content="content", author=with_posts)
+    Post.objects.create(title=None, content=faker.paragraph(), author=with_posts)
+    only_null_titles = Author.objects.create(name="only null titles")
+    Post.objects.create(title=None, content=faker.paragraph(), author=only_null_titles)
+    Author.objects.create(name="no posts")
+    return {
+        "with posts": {"title": "content"},
+        "only null titles": {},
+        "no posts": {},
+    }
+
+
+@pytest.mark.django_db
+def test_push_key_filter(faker: Faker):
+    """Test push_key_filter adds the non-null key condition to the join."""
+    expected = _create_authors_for_key_filter(faker)
+
+    queryset = Author.objects.annotate(
+        json_obj=JSONObjectAgg("posts__title", "posts__content", push_key_filter=True)
+    )
+
+    sql = str(queryset.query)
+    assert "IS NOT NULL" in sql.split(" FROM ")[1]
+    assert {author.name: author.json_obj for author in queryset} == expected
+    # compiling again gives the same result
+    assert str(queryset.query) == sql
+
+
+@pytest.mark.django_db
+def test_push_key_filter_shared_join(faker: Faker):
+    """Test the key filter isn't pushed when another expression uses the join."""
+    expected = _create_authors_for_key_filter(faker)
+
+    queryset = Author.objects.annotate(
+        json_obj=JSONObjectAgg("posts__title", "posts__content", push_key_filter=True),
+        titles=JSONArrayAgg("posts__title"),
+    )
+
+    assert "IS NOT NULL" not in str(queryset.query).split(" FROM ")[1]
+    assert {author.name: author.json_obj for author in queryset} == expected
+    assert {len(author.titles) for author in queryset} == {1, 2}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "queryset_method,args",
+    [("order_by", ("posts__title",)), ("values", ("name", "posts__content"))],
+)
+def test_push_key_filter_unsafe(queryset_method: str, args: tuple):
+    """Test the key filter isn't pushed when the join is used by the query."""
+    queryset = Author.objects.annotate(
+        json_obj=JSONObjectAgg("posts__title", "posts__content", push_key_filter=True)
+    )
+    queryset = getattr(queryset, queryset_method)(*args)
+
+    assert "IS NOT NULL" not in str(queryset.query).split(" FROM ")[1]
+
+
+def _key_filter_querysets():
+    def annotate(queryset, key="posts__title", value="posts__content"):
+        return lambda push: queryset.annotate(
+            json_obj=JSONObjectAgg(key, value, push_key_filter=push)
+        )
+
+    return {
+        "inner join": annotate(Post.objects.all(), key="author__name", value="title"),
+        "extra": annotate(Author.objects.extra(select={"one": "1"})),
+        "distinct fields": annotate(Author.objects.order_by("pk").distinct("pk")),
+        "chained join": annotate(
+            Author.objects.all(), value="posts__comments__content"
+        ),
+        "grouped by the relation": annotate(Author.objects.values("posts__year")),
+        "key expression": annotate(
+            Author.objects.alias(lower_title=Lower("posts__title")), key="lower_title"
+        ),
+    }
+
+
+def _rows(queryset):
+    return sorted(
+        repr(row if isinstance(row, dict) else (row.pk, row.json_obj))
+        for row in queryset
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", list(_key_filter_querysets()))
+def test_push_key_filter_not_safe(faker: Faker, name: str):
+    """Test the key filter isn't pushed when it could change other results."""
+    if name == "distinct fields" and not connection.features.can_distinct_on_fields:
+        pytest.skip("DISTINCT ON isn't supported.")
+    _create_authors_for_key_filter(faker)
+    Comment.objects.create(content="comment", post=Post.objects.first())
+    build = _key_filter_querysets()[name]
+
+    queryset = build(True)
+
+    assert "IS NOT NULL" not in str(queryset.query).split(" FROM ", 1)[1]
+    assert _rows(queryset) == _rows(build(False))
+
+
+@pytest.mark.django_db
+def test_push_key_filter_grouped_by_base_table(faker: Faker):
+    """Test the key filter is pushed when grouping by columns of the base table."""
+    _create_authors_for_key_filter(faker)
+
+    def build(push):
+        return Author.objects.values("name").annotate(
+            json_obj=JSONObjectAgg(
+                "posts__title", "posts__content", push_key_filter=push
+            )
+        )
+
+    assert "IS NOT NULL" in str(build(True).query).split(" FROM ", 1)[1]
+    assert _rows(build(True)) == _rows(build(False))
+
+
+@pytest.mark.django_db
+def test_conditional_join():
+    """Test the join wrapper only applies to its compiler and never outlives it."""
+    query = Author.objects.annotate(titles=JSONArrayAgg("posts__title")).query
+    (alias,) = (a for a, j in query.alias_map.items() if isinstance(j, Join))
+    join = query.alias_map[alias]
+    compiler = query.get_compiler(connection=connection)
+    conditional_join = ConditionalJoin(join, RawSQL("1 = 1", []), compiler)
+
+    assert conditional_join.identity == join.identity
+    relabeled = conditional_join.relabeled_clone({alias: "relabeled"})
+    assert type(relabeled) is Join
+    assert relabeled.table_alias == "relabeled"
+
+    # stale wrappers are unwrapped
+    query.alias_map[alias] = conditional_join
+    assert get_outer_join(query, alias) is join
+
+    other_compiler = query.get_compiler(connection=connection)
+    assert conditional_join.as_sql(other_compiler, connection) == join.as_sql(
+        other_compiler, connection
+    )
+    assert query.alias_map[alias] is join
+
+
+@pytest.mark.django_db
+def test_push_key_filter_explain(faker: Faker, db_vendor: str):
+    """Test the query plan with the key filter pushed to the join."""
+    _create_authors_for_key_filter(faker)
+    # only usable by queries implying the index condition (i.e., in the join)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE INDEX post_author_title_not_null "
+            "ON tests_post (author_id, title, content) WHERE title IS NOT NULL"
+        )
+
+    plans = {
+        push_key_filter: Author.objects.annotate(
+            json_obj=JSONObjectAgg(
+                "posts__title", "posts__content", push_key_filter=push_key_filter
+            )
+        ).explain()
+        for push_key_filter in (False, True)
+    }
+
+    if db_vendor == "postgresql":
+        # the condition is evaluated while scanning/joining posts, not afterwards
+        assert "title IS NOT NULL" in plans[True]
+        assert "title IS NOT NULL" not in plans[False]
+    else:
+        assert "USING COVERING INDEX post_author_title_not_null" in plans[True]
+        assert "post_author_title_not_null" not in plans[False]
+
+
+@pytest.mark.django_db
+def test_skip_null_values(faker: Faker):
+    """Test JSONObjectAgg skipping rows with a null value."""
+    author = Author.objects.create(name=faker.name())
+    Post.objects.create(title="null", author=author, content=None)
+    Post.objects.create(title="not-null", author=author, content="content")
+
+    annotated_result = Author.objects.annotate(
+        json_obj=JSONObjectAgg(
+            "posts__title", Lower("posts__content"), skip_null_values=True
+        ),
+        filtered_obj=JSONObjectAgg(
+            "posts__title",
+            "posts__content",
+            filter=Q(posts__title="null"),
+            skip_null_values=True,
+        ),
+    ).first()
+
+    assert annotated_result.json_obj == {"not-null": "content"}
+    assert annotated_result.filtered_obj == {}
+
+
+@pytest.mark.django_db
+def test_strip_nulls(faker: Faker):
+    """Test JSONObjectAgg removing null members at any depth."""
+    author = Author.objects.create(name=faker.name())
+    Post.objects.create(title="null", author=author, content=None)
+    Post.objects.create(
+        title="nested",
+        author=author,
+        metadata={"a": None, "b": [1, None, {"c": None, "d": "%]"}], "e": {"f": None}},
+    )
+    Post.objects.create(title="empty", author=author, metadata={})
+
+    annotated_result = Author.objects.annotate(
+        json_obj=JSONObjectAgg(
+            "posts__title", "posts__metadata", sqlite_func="json", strip_nulls=True
+        ),
+        contents=JSONObjectAgg("posts__title", "posts__content", strip_nulls=True),
+    ).first()
+
+    assert annotated_result.json_obj == {
+        "null": {},
+        "nested": {"b": [1, None, {"d": "%]"}], "e": {}},
+        "empty": {},
+    }
+    assert annotated_result.contents == {}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("decode", [list, partial(parallel_decode, threshold=0)])
+def test_key_output_field(faker: Faker, decode: callable):
+    """Test JSONObjectAgg keys converted with key_output_field."""
+    author = Author.objects.create(name=faker.name())
+    posts = Post.objects.bulk_create(
+        Post(title=faker.slug(), year=year, updated_at=faker.date_time(), author=author)
+        for year in range(2000, 2005)
+    )
+
+    (result,) = decode(
+        Author.objects.annotate(
+            titles=JSONObjectAgg(
+                "posts__year", "posts__title", key_output_field=IntegerField()
+            ),
+            dates=JSONObjectAgg(
+                "posts__year",
+                "posts__updated_at",
+                key_output_field=IntegerField(),
+                nested_output_field=DateTimeField(),
+            ),
+        )
+    )
+
+    assert result.titles == {post.year: post.title for post in posts}
+    assert result.dates == {post.year: post.updated_at for post in posts}
+
+
+def test_raise_value_error_invalid_key_output_field():
+    """Ensure ValueError is raised if invalid type is used for key_output_field."""
+    with pytest.raises(ValueError, match="'key_output_field' must be a Django"):
+        JSONObjectAgg("foo", "bar", key_output_field=int)
+
+
+@pytest.mark.django_db
+def test_keys_projection(faker: Faker):
+    """Test JSONObjectAgg projecting JSON values to the given paths."""
+    author = Author.objects.create(name=faker.name())
+    Post.objects.create(title="post", author=author, metadata={"a": 1, "b": 2})
+    null_post = Post.objects.create(title="null post", author=author)
+    Post.objects.filter(pk=null_post.pk).update(metadata=Value(None, JSONField()))
+    no_posts = Author.objects.create(name=faker.name())
+
+    annotated_result = Author.objects.annotate(
+        json_obj=JSONObjectAgg("posts__title", "posts__metadata", keys=["b"])
+    ).in_bulk()
+
+    assert annotated_result[author.pk].json_obj == {"post": {"b": 2}, "null post": None}
+    assert annotated_result[no_posts.pk].json_obj == {}
@@ -0,0 +1,166 @@
+"""Test parallel_decode helper."""
+
+from __future__ import annotations
+
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING
+
+import pytest
+from django.db.models import CharField
+from django.db.models import Count
+from django.db.models import DateTimeField
+from django.db.models import IntegerField
+from django.db.models import Q
+
+from json_agg import JSONArrayAgg
+from json_agg import JSONObjectAgg
+from json_agg import parallel_decode
+from json_agg._payloads import PayloadDecoder
+from tests.models import Author
+from tests.models import Post
+from tests.post_factory import post_factory
+
+
+if TYPE_CHECKING:
+    from faker import Faker
+
+
+class _UpperField(CharField):
+    def from_db_value(self, value, expression, connection):
+        return value.upper()
+
+
+class _NoSubmitExecutor(Executor):
+    def submit(self, fn, /, *args, **kwargs):
+        raise AssertionError("decoding should have happened inline")  # pragma: no cover
+
+
+@pytest.fixture(scope="module")
+def executor():
+    """Process pool shared by tests in this module."""
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+@pytest.mark.django_db
+def test_same_result_as_queryset(faker: Faker, executor: Executor):
+    """Test parallel_decode returns the same values as evaluating the queryset."""
+    post_factory(faker, value_name="updated_at", value_factory=faker.date_time)
+    Author.objects.create(name="no posts")
+    queryset = Author.objects.annotate(
+        post_map=JSONObjectAgg(
+            "posts__title", "posts__updated_at", nested_output_field=DateTimeField()
+        ),
+        titles=JSONArrayAgg("posts__title"),
+        dates=JSONArrayAgg("posts__updated_at", nested_output_field=DateTimeField()),
+    ).order_by("name")
+
+    expected = [(a.name, a.post_map, a.titles, a.dates) for a in queryset]
+    authors = parallel_decode(queryset, threshold=0, chunk_size=3, executor=executor)
+
+    assert [(a.name, a.post_map, a.titles, a.dates) for a in authors] == expected
+
+
+@pytest.mark.django_db
+def test_values_queryset(faker: Faker, executor: Executor):
+    """Test parallel_decode with a values() queryset."""
+    post_factory(
+        faker,
+        value_name="metadata",
+        value_factory=partial(faker.pydict, allowed_types=(str, int)),
+    )
+    queryset = (
+        Author.objects.values("name")
+        .annotate(metadata=JSONArrayAgg("posts__metadata", sqlite_func="json"))
+        .order_by("name")
+    )
+
+    result = parallel_decode(queryset, threshold=0, executor=executor)
+
+    assert result == list(queryset)
+
+
+@pytest.mark.django_db
+def test_below_threshold_stays_inline(faker: Faker):
+    """Test payloads are decoded inline without or below the threshold."""
+    post_factory(faker, value_name="content", value_factory=faker.paragraph)
+    queryset = Author.objects.annotate(
+        post_map=JSONObjectAgg("posts__title", "posts__content")
+    )
+    expected = {a.name: a.post_map for a in queryset}
+
+    authors = parallel_decode(queryset, executor=_NoSubmitExecutor())
+    assert {a.name: a.post_map for a in authors} == expected
+
+    authors = parallel_decode(queryset, threshold=2**30, executor=_NoSubmitExecutor())
+    assert {a.name: a.post_map for a in authors} == expected
+
+
+@pytest.mark.django_db
+def test_nested_from_db_value_is_converted_by_django(faker: Faker):
+    """Test aggregates relying on from_db_value are left to django converters."""
+    author = Author.objects.create(name=faker.name())
+    Post.objects.create(title="foo", author=author)
+    queryset = Author.objects.annotate(
+        titles=JSONArrayAgg("posts__title", nested_output_field=_UpperField())
+    )
+
+    (result,) = parallel_decode(queryset, threshold=0, executor=_NoSubmitExecutor())
+
+    assert result.titles == ["FOO"]
+
+
+@pytest.mark.django_db
+def test_own_executor(faker: Faker):
+    """Test parallel_decode creating its own process pool."""
+    post_factory(faker, value_name="year", value_factory=faker.pyint)
+    queryset = Author.objects.annotate(years=JSONArrayAgg("posts__year"))
+
+    authors = parallel_decode(queryset, threshold=0, max_workers=1)
+
+    assert {a.name: a.years for a in authors} == {a.name: a.years for a in queryset}
+
+
+@pytest.mark.django_db
+def test_inline_conversions(faker: Faker):
+    """Test inline decoding converts keys, values and empty payloads."""
+    post_factory(faker, value_name="year", value_factory=faker.pyint)
+    Author.objects.create(name="no posts")
+    queryset = Author.objects.annotate(
+        number_of_posts=Count("posts"),
+        years=JSONObjectAgg(
+            "posts__year", "posts__title", key_output_field=IntegerField()
+        ),
+        future_titles=JSONArrayAgg("posts__title", filter=Q(posts__year__gte=10000)),
+        future_dates=JSONArrayAgg(
+            "posts__updated_at",
+            filter=Q(posts__year__gte=10000),
+            nested_output_field=DateTimeField(),
+        ),
+    ).order_by("name")
+
+    authors = parallel_decode(queryset)
+
+    assert [
+        (a.name, a.number_of_posts, a.years, a.future_titles, a.future_dates)
+        for a in authors
+    ] == [
+        (a.name, a.number_of_posts, a.years, a.future_titles, a.future_dates)
+        for a in queryset
+    ]
+
+
+def test_decode_null_payloads():
+    """Test null payloads, as PostgreSQL returns without rows, are decoded."""
+    assert PayloadDecoder(is_object=False, field=None).decode(None) is None
+    assert PayloadDecoder(is_object=False, field=DateTimeField()).decode(None) == []
+    assert PayloadDecoder(is_object=True, field=None).decode(None) == {}
+
+
+def test_values_list_queryset():
+    """Ensure ValueError is raised for values_list() querysets."""
+    queryset = Author.objects.annotate(titles=JSONArrayAgg("posts__title"))
+    with pytest.raises(ValueError, match="values"):
+        parallel_decode(queryset.values_list("name", "titles"))
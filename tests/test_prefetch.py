@@ -0,0 +1,130 @@
+"""Test prefetch_json_agg."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from json_agg import JSONArrayAgg
+from json_agg import JSONObjectAgg
+from json_agg import prefetch_json_agg
+from tests.models import Author
+from tests.models import Post
+from tests.post_factory import post_factory
+
+
+if TYPE_CHECKING:
+    from faker import Faker
+
+
+@pytest.mark.django_db
+def test_prefetch_json_agg(faker: Faker):
+    """Test aggregates are set on evaluated instances."""
+    post_factory(faker, value_name="content", value_factory=faker.sentence)
+    Author.objects.create(name="no posts")
+    authors = list(Author.objects.order_by("name"))
+    aggregates = {
+        "post_map": JSONObjectAgg("posts__title", "posts__content"),
+        "titles": JSONArrayAgg("posts__title"),
+    }
+
+    with CaptureQueriesContext(connection) as queries:
+        prefetch_json_agg(authors, **aggregates)
+
+    assert len(queries) == 1
+    expected = Author.objects.annotate(**aggregates).order_by("name")
+    assert [(a.post_map, sorted(a.titles, key=repr)) for a in authors] == [
+        (a.post_map, sorted(a.titles, key=repr)) for a in expected
+    ]
+
+
+@pytest.mark.django_db
+def test_prefetch_json_agg_batches(faker: Faker, monkeypatch: pytest.MonkeyPatch):
+    """Test queries are split to fit the maximum number of query parameters."""
+    post_factory(
+        faker,
+        value_name="year",
+        value_factory=faker.pyint,
+        number_of_authors=10,
+        number_of_posts=2,
+    )
+    authors = list(Author.objects.all())
+    expected = {
+        author.pk: sorted(author.years)
+        for author in Author.objects.annotate(years=JSONArrayAgg("posts__year"))
+    }
+    # 1 parameter for the year filter, leaving 3 parameters for primary keys
+    monkeypatch.setattr(connection.features, "max_query_params", 4)
+
+    with CaptureQueriesContext(connection) as queries:
+        prefetch_json_agg(
+            authors,
+            years=JSONArrayAgg("posts__year", filter=Q(posts__year__gte=0)),
+        )
+
+    assert len(queries) == 4
+    assert {author.pk: sorted(author.years) for author in authors} == expected
+
+    with CaptureQueriesContext(connection) as queries:
+        prefetch_json_agg(authors, batch_size=2, years=JSONArrayAgg("posts__year"))
+    assert len(queries) == 5
+
+
+@pytest.mark.django_db
+def test_prefetch_json_agg_deleted_instance(faker: Faker):
+    """Test instances missing from the database get empty aggregates."""
+    author = Author.objects.create(name=faker.name())
+    Post.objects.create(title="title", content="content", author=author)
+    Author.objects.filter(pk=author.pk).delete()
+
+    prefetch_json_agg(
+        [author],
+        post_map=JSONObjectAgg("posts__title", "posts__content"),
+        titles=JSONArrayAgg("posts__title"),
+    )
+
+    assert author.post_map == {}
+    assert author.titles == []
+
+
+@pytest.mark.django_db
+def test_prefetch_json_agg_deleted_instances_not_shared(faker: Faker):
+    """Test deleted instances don't share their (mutable) empty aggregates."""
+    authors = [Author.objects.create(name=faker.name()) for _ in range(2)]
+    Author.objects.all().delete()
+
+    prefetch_json_agg(
+        authors,
+        post_map=JSONObjectAgg("posts__title", "posts__content"),
+        titles=JSONArrayAgg("posts__title"),
+    )
+
+    assert authors[0].post_map is not authors[1].post_map
+    assert authors[0].titles is not authors[1].titles
+
+
+@pytest.mark.django_db
+def test_prefetch_json_agg_empty():
+    """Test no query is made without instances."""
+    with CaptureQueriesContext(connection) as queries:
+        prefetch_json_agg([], titles=JSONArrayAgg("posts__title"))
+    assert not queries
+
+
+@pytest.mark.django_db
+def test_prefetch_json_agg_invalid_instances(faker: Faker):
+    """Ensure ValueError is raised for mixed models or unsaved instances."""
+    author = Author.objects.create(name=faker.name())
+    post = Post.objects.create(title="title", author=author)
+    titles = JSONArrayAgg("posts__title")
+
+    with pytest.raises(ValueError, match="same model"):
+        prefetch_json_agg([author, post], titles=titles)
+    with pytest.raises(ValueError, match="saved"):
+        prefetch_json_agg([Author(name="unsaved")], titles=titles)
+    with pytest.raises(ValueError, match="batch_size"):
+        prefetch_json_agg([author], batch_size=0, titles=titles)
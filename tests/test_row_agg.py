@@ -0,0 +1,213 @@
+"""Test JSONRowAgg aggregator and JSONAggSubquery."""
+
+from __future__ import annotations
+
+import datetime
+from typing import TYPE_CHECKING
+
+import pytest
+from django.db import connection
+from django.db.models import DateTimeField
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models.functions import Upper
+from django.test.utils import CaptureQueriesContext
+
+from json_agg import JSONAggSubquery
+from json_agg import JSONArrayAgg
+from json_agg import JSONObjectAgg
+from json_agg import JSONRowAgg
+from json_agg import parallel_decode
+from tests.models import Author
+from tests.models import Comment
+from tests.models import Post
+
+
+if TYPE_CHECKING:
+    from faker import Faker
+
+
+def _create_tree(faker: Faker, number_of_authors=3, posts=3, comments=2):
+    tree = {}
+    for _ in range(number_of_authors):
+        author = Author.objects.create(name=faker.unique.name())
+        tree[author.name] = {}
+        for _ in range(posts):
+            post = Post.objects.create(
+                title=faker.unique.slug(),
+                year=faker.pyint(),
+                metadata={"key": faker.word()},
+                author=author,
+            )
+            Comment.objects.bulk_create(
+                Comment(
+                    content=faker.sentence(),
+                    created_at=faker.date_time(),
+                    post=post,
+                )
+                for _ in range(comments)
+            )
+            tree[author.name][post.title] = post
+    return tree
+
+
+def _sorted(rows, key):
+    return sorted(rows, key=lambda row: row[key])
+
+
+@pytest.mark.django_db
+def test_aggregate_rows(faker: Faker):
+    """Test JSONRowAgg values are converted with their expression output field."""
+    tree = _create_tree(faker, comments=0)
+    Author.objects.create(name="no posts")
+
+    authors = Author.objects.annotate(
+        posts_list=JSONRowAgg(
+            title="posts__title",
+            upper_title=Upper("posts__title"),
+            year="posts__year",
+            metadata="posts__metadata",
+        )
+    )
+
+    result = {author.name: _sorted(author.posts_list, "title") for author in authors}
+    expected = {
+        name: _sorted(
+            [
+                {
+                    "title": p.title,
+                    "upper_title": p.title.upper(),
+                    "year": p.year,
+                    "metadata": p.metadata,
+                }
+                for p in posts.values()
+            ],
+            "title",
+        )
+        for name, posts in tree.items()
+    }
+    expected["no posts"] = []
+    assert result == expected
+
+
+@pytest.mark.django_db
+def test_nested_tree_in_one_query(faker: Faker):
+    """Test authors -> posts -> comments are fetched in a single query."""
+    tree = _create_tree(faker)
+    comments = Comment.objects.filter(post=OuterRef("posts"))
+
+    with CaptureQueriesContext(connection) as context:
+        authors = list(
+            Author.objects.annotate(
+                posts_list=JSONRowAgg(
+                    title="posts__title",
+                    comments=JSONAggSubquery(
+                        comments,
+                        JSONRowAgg(content="content", created_at="created_at"),
+                    ),
+                    comment_dates=JSONAggSubquery(
+                        comments,
+                        JSONArrayAgg("created_at", nested_output_field=DateTimeField()),
+                    ),
+                )
+            )
+        )
+
+    assert len(context) == 1
+    for author in authors:
+        for post_row in author.posts_list:
+            post = tree[author.name][post_row["title"]]
+            expected_comments = [
+                {"content": c.content, "created_at": c.created_at}
+                for c in post.comments.all()
+            ]
+            assert _sorted(post_row["comments"], "content") == _sorted(
+                expected_comments, "content"
+            )
+            assert sorted(post_row["comment_dates"]) == sorted(
+                c["created_at"] for c in expected_comments
+            )
+            assert all(
+                isinstance(c["created_at"], datetime.datetime)
+                for c in post_row["comments"]
+            )
+
+
+@pytest.mark.django_db
+def test_subquery_annotation(faker: Faker):
+    """Test JSONAggSubquery as an annotation, nesting subqueries."""
+    tree = _create_tree(faker, number_of_authors=2, posts=2, comments=1)
+    Author.objects.create(name="no posts")
+
+    authors = Author.objects.annotate(
+        posts_list=JSONAggSubquery(
+            Post.objects.filter(author=OuterRef("pk")),
+            JSONRowAgg(
+                title="title",
+                comments=JSONAggSubquery(
+                    Comment.objects.filter(post=OuterRef("pk")),
+                    JSONRowAgg(created_at="created_at"),
+                ),
+            ),
+        ),
+        post_map=JSONAggSubquery(
+            Post.objects.filter(author=OuterRef("pk")),
+            JSONObjectAgg("title", "year"),
+        ),
+    )
+
+    for author in authors:
+        posts = tree.get(author.name, {})
+        assert author.post_map == {title: p.year for title, p in posts.items()}
+        assert _sorted(author.posts_list, "title") == [
+            {
+                "title": title,
+                "comments": [
+                    {"created_at": c.created_at} for c in posts[title].comments.all()
+                ],
+            }
+            for title in sorted(posts)
+        ]
+
+
+@pytest.mark.django_db
+def test_filter(faker: Faker):
+    """Test JSONRowAgg with a filter."""
+    tree = _create_tree(faker, comments=0)
+
+    authors = Author.objects.annotate(
+        posts_list=JSONRowAgg(title="posts__title", filter=Q(posts__year__gte=5000))
+    )
+
+    for author in authors:
+        assert _sorted(author.posts_list, "title") == [
+            {"title": title}
+            for title, post in sorted(tree[author.name].items())
+            if post.year >= 5000
+        ]
+
+
+@pytest.mark.django_db
+def test_parallel_decode_converts_inline(faker: Faker):
+    """Test JSONRowAgg values are converted when decoded by parallel_decode."""
+    _create_tree(faker, number_of_authors=1, posts=1, comments=1)
+    queryset = Author.objects.annotate(
+        comments=JSONRowAgg(created_at="posts__comments__created_at")
+    )
+
+    (author,) = parallel_decode(queryset, threshold=0)
+
+    assert isinstance(author.comments[0]["created_at"], datetime.datetime)
+
+
+def test_raise_value_error_without_fields():
+    """Ensure ValueError is raised when no field is given."""
+    with pytest.raises(ValueError, match="at least one field"):
+        JSONRowAgg()
+
+
+@pytest.mark.parametrize("option", ["skip_null_values", "strip_nulls", "distinct"])
+def test_raise_value_error_with_aggregate_options(option: str):
+    """Ensure ValueError is raised for options instead of adding row members."""
+    with pytest.raises(ValueError, match=f"doesn't support '{option}'"):
+        JSONRowAgg(title="posts__title", **{option: True})